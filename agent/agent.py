@@ -4,12 +4,17 @@ import tenacity
 import asyncio
 import logging
 import os
-import json
+import sys
 import base64
-from typing import Any
-from datetime import datetime, timedelta,timezone
-import traceback
+import functools
+import io
+import time
+from typing import Any, TypedDict
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import httpx
+import orjson
 from dotenv import load_dotenv
 import boto3
 from botocore.exceptions import ClientError
@@ -23,6 +28,7 @@ from livekit.agents import (
     Agent,
     AgentSession,
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
     function_tool,
@@ -43,137 +49,448 @@ load_dotenv(".env")
 logger = logging.getLogger("outbound-caller")
 logger.setLevel(logging.INFO)
 
+
 # Environment variables
-OUTBOUND_TRUNK_ID = os.getenv("SIP_OUTBOUND_TRUNK_ID")
-BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://3.135.250.76:8000")
-AWS_BUCKET_NAME = os.getenv("AWS_S3_BUCKET_NAME")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-UPLOAD_TRANSCRIPTS = os.getenv("UPLOAD_TRANSCRIPTS", "true").lower() in ("1", "true", "yes")
-UPLOAD_RECORDINGS = os.getenv("UPLOAD_RECORDINGS", "true").lower() in ("1", "true", "yes")
-
-# Turn detection parameters
-TURN_DETECTION_MIN_ENDPOINTING_DELAY = float(os.getenv("TURN_DETECTION_MIN_ENDPOINTING_DELAY", "0.3"))
-TURN_DETECTION_MIN_SILENCE_DURATION = float(os.getenv("TURN_DETECTION_MIN_SILENCE_DURATION", "0.3"))
-
-async def _speak_status_update(ctx: RunContext, message: str, delay: float = 0.3):
-    """Speak a brief status update before performing an action."""
-    await asyncio.sleep(delay)
-    await ctx.session.say(message, allow_interruptions=True)
-    await asyncio.sleep(0.2)  # Brief pause after speaking
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Worker configuration, read from the environment once at import"""
+    outbound_trunk_id: str | None
+    backend_api_url: str
+    aws_bucket_name: str | None
+    aws_access_key_id: str | None
+    aws_secret_access_key: str | None
+    aws_region: str
+    upload_transcripts: bool
+    upload_recordings: bool
+    appointments_cache_ttl: float
+    openai_api_key: str | None
+    deepgram_api_key: str | None
+    elevenlabs_api_key: str | None
+    elevenlabs_voice_id: str | None
+    # Turn detection parameters
+    turn_detection_min_endpointing_delay: float
+    turn_detection_min_silence_duration: float
+
+    @classmethod
+    def load(cls) -> "Settings":
+        return cls(
+            outbound_trunk_id=os.getenv("SIP_OUTBOUND_TRUNK_ID"),
+            backend_api_url=os.getenv("BACKEND_API_URL", "http://3.135.250.76:8000"),
+            aws_bucket_name=os.getenv("AWS_S3_BUCKET_NAME"),
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            aws_region=os.getenv("AWS_REGION", "us-east-1"),
+            upload_transcripts=_env_flag("UPLOAD_TRANSCRIPTS", "true"),
+            upload_recordings=_env_flag("UPLOAD_RECORDINGS", "true"),
+            appointments_cache_ttl=float(os.getenv("APPOINTMENTS_CACHE_TTL", "45")),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            deepgram_api_key=os.getenv("DEEPGRAM_API_KEY"),
+            elevenlabs_api_key=os.getenv("ELEVENLABS_API_KEY"),
+            elevenlabs_voice_id=os.getenv("ELEVENLABS_VOICE_ID"),
+            turn_detection_min_endpointing_delay=float(os.getenv("TURN_DETECTION_MIN_ENDPOINTING_DELAY", "0.3")),
+            turn_detection_min_silence_duration=float(os.getenv("TURN_DETECTION_MIN_SILENCE_DURATION", "0.3")),
+        )
 
+    def missing(self) -> list[str]:
+        """Names of required environment variables that are not set"""
+        required = {
+            "SIP_OUTBOUND_TRUNK_ID": self.outbound_trunk_id,
+            "OPENAI_API_KEY": self.openai_api_key,
+            "DEEPGRAM_API_KEY": self.deepgram_api_key,
+            "ELEVENLABS_API_KEY": self.elevenlabs_api_key,
+        }
+        if self.upload_transcripts or self.upload_recordings:
+            required.update({
+                "AWS_S3_BUCKET_NAME": self.aws_bucket_name,
+                "AWS_ACCESS_KEY_ID": self.aws_access_key_id,
+                "AWS_SECRET_ACCESS_KEY": self.aws_secret_access_key,
+            })
+        return [name for name, value in required.items() if not value]
+
+
+SETTINGS = Settings.load()
+
+def _speak_status_update(ctx: RunContext, message: str):
+    """Queue a brief spoken status update; the tool work proceeds while it plays."""
+    # session.say() schedules the speech and returns a SpeechHandle; not awaiting it
+    # lets TTS playout overlap with the backend call instead of delaying it
+    ctx.session.say(message, allow_interruptions=True)
+
+@functools.lru_cache(maxsize=1)
 def get_s3_client():
-    """Initialize AWS S3 client"""
-    if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
+    """Initialize AWS S3 client (built and verified once per worker process)"""
+    if not SETTINGS.aws_access_key_id or not SETTINGS.aws_secret_access_key:
         raise RuntimeError("Missing AWS credentials (AWS_ACCESS_KEY_ID or AWS_SECRET_ACCESS_KEY)")
     
-    if not AWS_BUCKET_NAME:
+    if not SETTINGS.aws_bucket_name:
         raise RuntimeError("Missing AWS_S3_BUCKET_NAME environment variable")
     
     try:
         s3_client = boto3.client(
             's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
+            aws_access_key_id=SETTINGS.aws_access_key_id,
+            aws_secret_access_key=SETTINGS.aws_secret_access_key,
+            region_name=SETTINGS.aws_region
         )
         
         # Test connection
-        s3_client.head_bucket(Bucket=AWS_BUCKET_NAME)
-        logger.info(f"✅ S3 client initialized: {AWS_BUCKET_NAME}")
+        s3_client.head_bucket(Bucket=SETTINGS.aws_bucket_name)
+        logger.info(f"✅ S3 client initialized: {SETTINGS.aws_bucket_name}")
         
         return s3_client
         
     except ClientError as e:
         error_code = e.response['Error']['Code']
         if error_code == '404':
-            raise RuntimeError(f"S3 bucket '{AWS_BUCKET_NAME}' not found")
+            raise RuntimeError(f"S3 bucket '{SETTINGS.aws_bucket_name}' not found")
         elif error_code == '403':
-            raise RuntimeError(f"Access denied to bucket '{AWS_BUCKET_NAME}'")
+            raise RuntimeError(f"Access denied to bucket '{SETTINGS.aws_bucket_name}'")
         else:
             raise RuntimeError(f"S3 client error: {e}")
     except Exception as e:
         raise RuntimeError(f"Failed to initialize S3 client: {e}")
     
 
+@functools.lru_cache(maxsize=1)
+def _egress_request_template() -> api.RoomCompositeEgressRequest:
+    """Audio-only S3 egress request, built once per worker; only room/filepath vary per call"""
+    return api.RoomCompositeEgressRequest(
+        audio_only=True,
+        file_outputs=[
+            api.EncodedFileOutput(
+                file_type=api.EncodedFileType.OGG,
+                s3=api.S3Upload(
+                    access_key=SETTINGS.aws_access_key_id,
+                    secret=SETTINGS.aws_secret_access_key,
+                    region=SETTINGS.aws_region,
+                    bucket=SETTINGS.aws_bucket_name
+                )
+            )
+        ],
+    )
+
+
+def _egress_request(room_name: str, filepath: str) -> api.RoomCompositeEgressRequest:
+    req = api.RoomCompositeEgressRequest()
+    req.CopyFrom(_egress_request_template())
+    req.room_name = room_name
+    req.file_outputs[0].filepath = filepath
+    return req
+
+
+@functools.lru_cache(maxsize=1)
+def _s3_object_url_prefix() -> str:
+    return f"https://{SETTINGS.aws_bucket_name}.s3.{SETTINGS.aws_region}.amazonaws.com/"
+
+
+def _sync_upload(key: str, data: bytes, content_type: str):
+    # upload_fileobj streams from the buffer (switching to multipart for large objects)
+    # instead of handing botocore one big request body
+    get_s3_client().upload_fileobj(
+        io.BytesIO(data),
+        SETTINGS.aws_bucket_name,
+        key,
+        ExtraArgs={"ContentType": content_type}
+    )
+
+
+async def upload_blob_async(key: str, data: bytes | str, content_type: str = "application/json"):
+    """Upload an object to the S3 bucket without blocking the event loop"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    await asyncio.to_thread(_sync_upload, key, data, content_type)
+
+
+# Request bodies are pre-serialized with orjson and sent as raw content
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Per-endpoint timeouts (seconds) for agent -> backend calls
+HTTP_TIMEOUTS = {
+    "appointments": 10.0,
+    "book": 15.0,
+    "notify": 5.0,
+    "save": 60.0,
+    "status": 5.0,
+}
+
+# Shared HTTP client for agent -> backend calls (one keepalive pool per worker)
+_HTTP: httpx.AsyncClient | None = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Return the pooled backend client, creating it on first use"""
+    global _HTTP
+    if _HTTP is None or _HTTP.is_closed:
+        _HTTP = httpx.AsyncClient(
+            base_url=SETTINGS.backend_api_url,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return _HTTP
+
+
+async def post_json(path: str, payload: dict, timeout: float) -> httpx.Response:
+    """POST an orjson-encoded body to the backend over the pooled client"""
+    client = await get_http_client()
+    return await client.post(path, content=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=timeout)
+
+
+# Jobs in this process currently using _HTTP; the client is shared, so it is only
+# closed once the last of them has finished its shutdown work
+_HTTP_JOBS = 0
+
+
+def retain_http_client():
+    """Mark a job in this process as a user of the shared backend client"""
+    global _HTTP_JOBS
+    _HTTP_JOBS += 1
+
+
+async def release_http_client():
+    """Drop a job's hold on the shared client, closing it when no job in the process needs it"""
+    global _HTTP, _HTTP_JOBS
+    _HTTP_JOBS = max(0, _HTTP_JOBS - 1)
+    if _HTTP_JOBS == 0 and _HTTP is not None:
+        client, _HTTP = _HTTP, None
+        await client.aclose()
+
+
+# Process-wide appointment cache shared by every agent in this worker, keyed by user_id
+_APPTS_CACHE: dict[Any, tuple[float, list]] = {}
+_APPTS_LOCKS: dict[Any, asyncio.Lock] = {}
+
+
+async def get_appointments(user_id, timeout: float = HTTP_TIMEOUTS["appointments"]) -> list:
+    """
+    Return the user's upcoming appointments, refetching only when the cached copy
+    is older than SETTINGS.appointments_cache_ttl. Concurrent agents for the same
+    user share a single backend request.
+    """
+    cached = _APPTS_CACHE.get(user_id)
+    if cached and time.monotonic() - cached[0] < SETTINGS.appointments_cache_ttl:
+        return cached[1]
+
+    lock = _APPTS_LOCKS.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        # Another agent may have refreshed while we waited for the lock
+        cached = _APPTS_CACHE.get(user_id)
+        if cached and time.monotonic() - cached[0] < SETTINGS.appointments_cache_ttl:
+            return cached[1]
+
+        client = await get_http_client()
+        response = await client.get(
+            f"/api/agent/get-appointments/{user_id}",
+            params={"from_date": datetime.now().strftime("%Y-%m-%d")},
+            timeout=timeout,
+            follow_redirects=True,
+        )
+        response.raise_for_status()
+        appointments = orjson.loads(response.content).get("appointments", [])
+        _APPTS_CACHE[user_id] = (time.monotonic(), appointments)
+        return appointments
+
+
+def invalidate_appointments(user_id):
+    """Drop the cached appointments for a user (e.g. after a booking)"""
+    _APPTS_CACHE.pop(user_id, None)
+
+
+def _clock_minutes(value) -> int:
+    """Parse 'HH:MM', 'H:MM' or 'HH:MM:SS' (as returned by the backend) into minute-of-day"""
+    hour, minute = str(value).split(':')[:2]
+    return int(hour) * 60 + int(minute)
+
+
+def _parse_hhmm(value: str) -> int:
+    """Parse a strict 'HH:MM' (or 'H:MM') 24-hour time into minute-of-day; raises ValueError"""
+    hour, sep, minute = str(value).partition(':')
+    if not sep or not hour.isdigit() or len(hour) > 2 or len(minute) != 2 or not minute.isdigit():
+        raise ValueError(f"Invalid HH:MM time: {value!r}")
+    hour, minute = int(hour), int(minute)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Invalid HH:MM time: {value!r}")
+    return hour * 60 + minute
+
+
+def _index_appointments(appointments: list) -> dict[str, list[tuple[int, int, dict]]]:
+    """Group appointments by date as (start_min, end_min, appointment), parsed once up front"""
+    by_date: dict[str, list[tuple[int, int, dict]]] = {}
+    for apt in appointments:
+        try:
+            entry = (_clock_minutes(apt["start_time"]), _clock_minutes(apt["end_time"]), apt)
+        except Exception as e:
+            logger.warning("⚠️ Could not parse cached time: %s. Skipping. Error: %s", apt, e)
+            continue
+        by_date.setdefault(apt["date"], []).append(entry)
+    return by_date
+
+
+def _utc_now_iso() -> str:
+    """Current UTC time as ISO-8601 with millisecond precision (backend event timestamps)"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+# Characters dropped from phone numbers when they're used in object names
+_PHONE_STRIP = str.maketrans("", "", "+- ")
+
+
+def _utc_compact_stamp() -> str:
+    """Current UTC time as YYYYMMDDTHHMMSSZ (S3 object names)"""
+    now = datetime.now(timezone.utc)
+    return "%04d%02d%02dT%02d%02d%02dZ" % (now.year, now.month, now.day, now.hour, now.minute, now.second)
+
+
+def _is_retryable_http_error(exc: BaseException) -> bool:
+    """Retry on connect/transport failures and 5xx responses only"""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code >= 500
+
+
+@tenacity.retry(
+    stop=tenacity.stop_after_attempt(3),
+    # Jitter keeps workers restarting together from retrying in lockstep
+    wait=tenacity.wait_exponential(multiplier=0.2, max=2) + tenacity.wait_random(0, 0.3),
+    retry=tenacity.retry_if_exception(_is_retryable_http_error),
+    reraise=True,
+)
+async def _post_backend(path: str, payload: dict, timeout: float) -> httpx.Response:
+    response = await post_json(path, payload, timeout)
+    response.raise_for_status()
+    return response
+
+
+# Bookkeeping POSTs (status events, call-started, recording info) are queued and
+# delivered in order by one background task, so the voice path never waits on the
+# backend. Consecutive status events in a burst go out as a single batch POST.
+STATUS_EVENT_PATH = "/api/agent/report-event"
+BACKEND_BATCH_WINDOW = 0.05
+BACKEND_BATCH_MAX = 50
+_BACKEND_Q: asyncio.Queue | None = None
+_BACKEND_FLUSHER: asyncio.Task | None = None
+
+
+def _backend_queue() -> asyncio.Queue:
+    """Return the outbound queue, (re)starting the flusher task if needed"""
+    global _BACKEND_Q, _BACKEND_FLUSHER
+    if _BACKEND_Q is None:
+        _BACKEND_Q = asyncio.Queue()
+    if _BACKEND_FLUSHER is None or _BACKEND_FLUSHER.done():
+        _BACKEND_FLUSHER = asyncio.create_task(_backend_flusher(_BACKEND_Q))
+    return _BACKEND_Q
+
+
+def queue_backend_post(path: str, payload: dict):
+    """Schedule a POST to the backend without waiting for it"""
+    _backend_queue().put_nowait((path, payload))
+
+
+async def _backend_flusher(queue: asyncio.Queue):
+    while True:
+        batch = [await queue.get()]
+        # Give the rest of the burst a moment to arrive
+        await asyncio.sleep(BACKEND_BATCH_WINDOW)
+        while len(batch) < BACKEND_BATCH_MAX and not queue.empty():
+            batch.append(queue.get_nowait())
+        try:
+            await _deliver_backend_batch(batch)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def _deliver_backend_post(path: str, payload: dict):
+    try:
+        await _post_backend(path, payload, HTTP_TIMEOUTS["notify"])
+    except Exception as e:
+        logger.warning(f"Could not deliver {path}: {e}")
+
+
+async def _deliver_backend_batch(batch: list[tuple[str, dict]]):
+    # Status events must stay in order relative to everything else; runs of other
+    # (independent) notifications between them are sent concurrently
+    events: list[dict] = []
+    others: list[tuple[str, dict]] = []
+    for path, payload in batch:
+        if path == STATUS_EVENT_PATH:
+            if others:
+                await asyncio.gather(*(_deliver_backend_post(p, j) for p, j in others))
+                others = []
+            events.append(payload)
+        else:
+            if events:
+                await _deliver_status_events(events)
+                events = []
+            others.append((path, payload))
+    if others:
+        await asyncio.gather(*(_deliver_backend_post(p, j) for p, j in others))
+    if events:
+        await _deliver_status_events(events)
+
+
+async def _deliver_status_events(events: list[dict]):
+    try:
+        response = await _post_backend("/api/agent/report-event-batch", {"events": events}, HTTP_TIMEOUTS["status"])
+        results = orjson.loads(response.content).get("results", [])
+    except Exception as e:
+        logger.error(f" Failed to send {len(events)} status event(s): {e}")
+        return
+
+    for event, result in zip(events, results):
+        if result.get("status_code") == 200:
+            logger.info(f"Status '{event['status']}' sent for {event['call_id']}")
+        else:
+            logger.warning(f" Status '{event['status']}' rejected for {event['call_id']}: {result.get('error')}")
+
+
+async def flush_backend_queue(timeout: float = 10.0):
+    """Deliver any queued backend POSTs (registered as a shutdown callback)"""
+    global _BACKEND_FLUSHER
+    if _BACKEND_Q is None:
+        return
+    try:
+        await asyncio.wait_for(_BACKEND_Q.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.error(f" Gave up flushing {_BACKEND_Q.qsize()} backend request(s) after {timeout}s")
+    if _BACKEND_FLUSHER is not None:
+        _BACKEND_FLUSHER.cancel()
+        _BACKEND_FLUSHER = None
+
+
 async def send_status_to_backend(
     call_id: str,
     status: str,
     user_id: int = None,
     error_details: dict = None
 ):
-    """Send status with GUARANTEED delivery"""
+    """Queue a status event for batched delivery to the backend (returns immediately)"""
     payload = {
         "call_id": call_id,
         "status": status,
         "user_id": user_id,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": _utc_now_iso()
     }
     
     if status == "failed" and error_details:
         payload["error_details"] = error_details
     
-    for attempt in range(3):
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.post(
-                    f"{BACKEND_API_URL}/api/agent/report-event",
-                    json=payload
-                )
-                if response.status_code == 200:
-                    logger.info(f"Status '{status}' sent for {call_id}")
-                    return
-        except Exception as e:
-            if attempt == 2:
-                logger.error(f" Failed to send status after 3 attempts: {e}")
-            else:
-                await asyncio.sleep(0.5)
+    queue_backend_post(STATUS_EVENT_PATH, payload)
 
     
-class SimpleOutboundCaller(Agent):
-    def __init__(self, *, call_context: str, dial_info: dict[str, Any]):
-        self.user_id = dial_info.get("user_id")
-        self.caller_name = dial_info.get("caller_name", "our office")
-        self.caller_email = dial_info.get("caller_email")
-        self.phone_number = dial_info.get("phone_number")
-        self.agent_name = dial_info.get("agent_name","Paul")
-        
-        #  NEW: Get complete system prompt from metadata (passed from backend)
-        system_prompt = dial_info.get("system_prompt")
-        
-        #  Fallback: Use hardcoded prompt if not provided
-        if not system_prompt:
-            logger.warning(" No system_prompt in metadata, using hardcoded fallback")
-            system_prompt = self._build_fallback_prompt(call_context)
-            logger.info(f" Using fallback prompt ({len(system_prompt)} chars)")
-        
-        logger.info(f"🤖 Initializing agent '{self.agent_name}' with prompt ({len(system_prompt)} chars)")
-        
-        # Pass to parent Agent class
-        super().__init__(instructions=system_prompt)
-        
-        self.participant: rtc.RemoteParticipant | None = None
-        self.dial_info = dial_info
-        self.sip_call_id: str | None = None
-        self.appointments_cache = []
-        self.attendee_name: str | None = None
-        self.egress_id: str | None = None
-        self.recording_url: str | None = None
-        self.recording_blob_path: str | None = None
-
-    def _build_fallback_prompt(self, call_context: str) -> str:
-        """
-        Hardcoded fallback prompt when system_prompt is not provided in metadata.
-        This ensures the agent can still function on LiveKit cloud without local imports.
-        """
-        return f"""You are {self.agent_name}, an AI assistant that makes phone calls to businesses on behalf of clients to book appointments and reservations.
+# Hardcoded fallback prompt used when system_prompt is not provided in metadata.
+# This ensures the agent can still function on LiveKit cloud without local imports.
+# Kept at module level so the ~10 KB text is built once, not per agent.
+_FALLBACK_PROMPT_TEMPLATE = """You are {agent_name}, an AI assistant that makes phone calls to businesses on behalf of clients to book appointments and reservations.
 
                 ### IDENTITY & ROLE
 
                 #### WHO YOU ARE:
-                - You are {self.agent_name}, a professional AI assistant
-                - You represent your client: {self.caller_name}
+                - You are {agent_name}, a professional AI assistant
+                - You represent your client: {caller_name}
                 - You are the CUSTOMER calling the business
                 - You are NOT affiliated with the business you're calling
 
@@ -188,7 +505,7 @@ class SimpleOutboundCaller(Agent):
                 ### CONVERSATION PROTOCOL - MANDATORY SEQUENCE
 
                 #### STEP 1: INTRODUCTION [REQUIRED - ALWAYS START HERE]
-                **Template:** "Hi! This is {self.agent_name} calling on behalf of {self.caller_name}. How are you doing today?"
+                **Template:** "Hi! This is {agent_name} calling on behalf of {caller_name}. How are you doing today?"
 
                 **Rules:**
                 - Use this exact greeting structure
@@ -197,7 +514,7 @@ class SimpleOutboundCaller(Agent):
                 - Wait for their response
 
                 #### STEP 2: STATE PURPOSE [REQUIRED]
-                **Template:** "I'm calling to [book an appointment/make a reservation] for {self.caller_name}."
+                **Template:** "I'm calling to [book an appointment/make a reservation] for {caller_name}."
 
                 Then provide specifics:
                 - What service/appointment type is needed
@@ -249,7 +566,7 @@ class SimpleOutboundCaller(Agent):
                 1. Verbally confirm: "So we're all set for [day of week], [date] at [time]. Is that correct?"
                 2. Wait for their confirmation
                 3. Call: book_appointment(date, time, service_type, business_name, notes)
-                4. Confirm aloud: "Perfect! I've booked {self.caller_name} for [date] at [time]. Thank you!"
+                4. Confirm aloud: "Perfect! I've booked {caller_name} for [date] at [time]. Thank you!"
 
                 **Required information for booking:**
                 - Date (YYYY-MM-DD format)
@@ -394,7 +711,7 @@ class SimpleOutboundCaller(Agent):
                     business_name="Bright Smiles Dental",
                     notes="First visit, bring insurance card"
                 )
-                4. You: "All set! I've booked {self.caller_name} for November 5th at 2pm."
+                4. You: "All set! I've booked {caller_name} for November 5th at 2pm."
 
                 **NEVER:**
                 - Book without confirming availability first
@@ -436,7 +753,7 @@ class SimpleOutboundCaller(Agent):
 
                 **USAGE PATTERN:**
                 1. Detect voicemail
-                2. Leave brief message: "Hi, this is {self.agent_name} calling for {self.caller_name} about booking an appointment. We'll try calling back later. Thank you!"
+                2. Leave brief message: "Hi, this is {agent_name} calling for {caller_name} about booking an appointment. We'll try calling back later. Thank you!"
                 3. Call: detected_answering_machine(left_message=true)
                 4. Call: end_call()
 
@@ -470,19 +787,19 @@ class SimpleOutboundCaller(Agent):
 
                 #### SCENARIO: They ask for client's phone number
                 **RESPONSE:**
-                - Provide if you have it: "Sure, it's {self.phone_number if self.phone_number else '[number]'}"
+                - Provide if you have it: "Sure, it's {phone_number}"
                 - If you don't have it: "Let me get that for you... Actually, I don't have that information handy. Could we use my callback number for now?"
 
                 #### SCENARIO: They ask questions you can't answer
                 **RESPONSE:**
-                - "That's a great question. I don't have that information right now, but {self.caller_name} will call you back to confirm that detail."
+                - "That's a great question. I don't have that information right now, but {caller_name} will call you back to confirm that detail."
                 - Still complete the booking if possible
                 - Note the question in booking notes
 
                 #### SCENARIO: They ask about insurance/payment
                 **RESPONSE:**
                 - If you have the info: Provide it
-                - If you don't: "{self.caller_name} will have that information with them at the appointment"
+                - If you don't: "{caller_name} will have that information with them at the appointment"
                 - Note in booking: "Needs to verify insurance/payment"
 
                 #### SCENARIO: Multiple time slots discussed
@@ -537,64 +854,107 @@ class SimpleOutboundCaller(Agent):
                 """
 
 
+# Tool response / payload templates
+_FREE_DAY_MSG = "Your client {} is completely free on {}. Any time works!".format
+_BOOKED_AT_MSG = "Your client is already booked at: {}. They're free at other times.".format
+_BOOKING_DESCRIPTION = "Appointment booked on behalf of {}".format
+
+
+class BookPayload(TypedDict):
+    """Body of POST /api/agent/book-appointment, in the order the backend reads it"""
+    user_id: Any
+    appointment_date: str
+    start_time: str
+    end_time: str
+    attendee_name: str
+    title: str
+    description: str
+    organizer_name: str
+    organizer_email: str | None
+    notes: str
+
+
+class SimpleOutboundCaller(Agent):
+    def __init__(self, *, call_context: str, dial_info: dict[str, Any]):
+        self.user_id = dial_info.get("user_id")
+        self.caller_name = dial_info.get("caller_name", "our office")
+        self.caller_email = dial_info.get("caller_email")
+        self.phone_number = dial_info.get("phone_number")
+        self.agent_name = dial_info.get("agent_name","Paul")
+        
+        #  NEW: Get complete system prompt from metadata (passed from backend)
+        system_prompt = dial_info.get("system_prompt")
+        
+        #  Fallback: Use hardcoded prompt if not provided
+        if not system_prompt:
+            logger.warning(" No system_prompt in metadata, using hardcoded fallback")
+            system_prompt = _FALLBACK_PROMPT_TEMPLATE.format_map({
+                "agent_name": self.agent_name,
+                "caller_name": self.caller_name,
+                "phone_number": self.phone_number or "[number]",
+                "call_context": call_context,
+            })
+            logger.info(" Using fallback prompt (%d chars)", len(system_prompt))
+        
+        logger.info("🤖 Initializing agent '%s' with prompt (%d chars)", self.agent_name, len(system_prompt))
+        
+        # Pass to parent Agent class (it keeps the only reference we need)
+        super().__init__(instructions=system_prompt)
+        del system_prompt
+        
+        self.participant: rtc.RemoteParticipant | None = None
+        self.sip_call_id: str | None = None
+        self.appointments_cache = []
+        self._appts_by_date: dict[str, list[tuple[int, int, dict]]] = {}
+        self.appointments_by_date: dict[str, list[dict]] = {}
+        self._slots_info_cache: dict[str, tuple[int, str]] = {}
+        self.attendee_name: str | None = None
+        self.egress_id: str | None = None
+        self.recording_url: str | None = None
+        self.recording_blob_path: str | None = None
+
     def set_participant(self, participant: rtc.RemoteParticipant):
         self.participant = participant
 
     def set_sip_call_id(self, call_id: str):
         self.sip_call_id = call_id
 
+    def _set_appointments(self, appointments: list):
+        """Replace the local appointment cache and rebuild the per-date indexes"""
+        self.appointments_cache = list(appointments)
+        self._appts_by_date = _index_appointments(self.appointments_cache)
+        by_date: dict[str, list[dict]] = {}
+        for apt in self.appointments_cache:
+            by_date.setdefault(apt["date"], []).append(apt)
+        self.appointments_by_date = by_date
+        self._slots_info_cache = {}
+
     async def load_appointments(self):
         """Load user's appointments in the background - NON-BLOCKING"""
         try:
-            from datetime import datetime
-            from_date = datetime.now().strftime("%Y-%m-%d")
+            logger.info(" Fetching appointments for user %s (background)", self.user_id)
             
-            url = f"{BACKEND_API_URL}/api/agent/get-appointments/{self.user_id}"
-            params = {"from_date": from_date}
+            self._set_appointments(await get_appointments(self.user_id))
+            logger.info(" Loaded %d appointments", len(self.appointments_cache))
             
-            logger.info("=" * 80)
-            logger.info(" FETCHING APPOINTMENTS (BACKGROUND)")
-            logger.info(f"   URL: {url}")
-            logger.info(f"   Params: {params}")
-            logger.info("=" * 80)
-            
-            #  Use shorter timeout - we don't want to wait forever
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(10.0, connect=5.0),  # Reduced from 30s to 10s
-                follow_redirects=True,
-                verify=True,
-            ) as client:
-                logger.info("📡 Sending GET request...")
-                response = await client.get(url, params=params)
-                
-                logger.info(f"📥 Response status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    self.appointments_cache = data.get("appointments", [])
-                    logger.info(f" Loaded {len(self.appointments_cache)} appointments")
-                    
-                    if len(self.appointments_cache) > 0:
-                        logger.info(f"📋 Sample: {self.appointments_cache[0]}")
-                else:
-                    logger.warning(f" Non-200 status: {response.status_code}")
-                    self.appointments_cache = []
+            if self.appointments_cache and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📋 Sample: %s", self.appointments_cache[0])
                     
+        except httpx.HTTPStatusError as e:
+            logger.warning(" Non-200 status: %s", e.response.status_code)
+            self._set_appointments([])
+            
         except httpx.ConnectError as e:
-            logger.error(f" CONNECTION ERROR")
-            logger.error(f"   Cannot reach: {BACKEND_API_URL}")
-            logger.error(f"   Error: {e}")
-            self.appointments_cache = []
+            logger.error(" CONNECTION ERROR - cannot reach %s: %s", SETTINGS.backend_api_url, e)
+            self._set_appointments([])
             
         except httpx.ReadTimeout:
-            logger.error(f" READ TIMEOUT (>10s)")
-            logger.error(f"   Backend took too long to respond")
-            logger.error(f"   Continuing with empty cache")
-            self.appointments_cache = []
+            logger.error(" READ TIMEOUT (>10s) - continuing with empty cache")
+            self._set_appointments([])
             
         except Exception as e:
-            logger.error(f" ERROR: {type(e).__name__}: {e}")
-            self.appointments_cache = []
+            logger.error(" ERROR: %s: %s", type(e).__name__, e)
+            self._set_appointments([])
 
 
     @function_tool()
@@ -609,104 +969,78 @@ class SimpleOutboundCaller(Agent):
         Check if YOUR CLIENT is available at this time.
         Will wait for appointments to load if still loading.
         """
-        await _speak_status_update(ctx, "Let me check if that works for us...")
+        _speak_status_update(ctx, "Let me check if that works for us...")
         
-        # ✅ Import time object for comparison
-        from datetime import datetime, timedelta, time
-
         try:
-            # Auto-calculate end_time if not provided
-            if not end_time:
-                start_dt = datetime.strptime(start_time, "%H:%M")
-                end_dt = start_dt + timedelta(hours=1)
-                end_time = end_dt.strftime("%H:%M")
-            
-            # ✅ Convert proposed times to time objects for correct comparison
+            # ✅ Convert proposed times to minute-of-day ints for correct comparison
             try:
-                proposed_start_t = datetime.strptime(start_time, "%H:%M").time()
-                proposed_end_t = datetime.strptime(end_time, "%H:%M").time()
+                proposed_start = _parse_hhmm(start_time)
+                if end_time:
+                    proposed_end = _parse_hhmm(end_time)
+                else:
+                    # No end given: assume one hour, capped at midnight (minute 1440) so a
+                    # late start still gets a non-empty range on the same date
+                    proposed_end = min(proposed_start + 60, 24 * 60)
+                    end_time = f"{proposed_end // 60:02d}:{proposed_end % 60:02d}"
             except ValueError:
-                logger.error(f"❌ Invalid proposed time format: {start_time}-{end_time}")
+                logger.error("❌ Invalid proposed time format: %s-%s", start_time, end_time)
                 # Tell the agent the format is wrong so it can re-ask
                 return {
                     "available": False, 
                     "message": "The time format provided was invalid. Please ensure it's HH:MM 24-hour format."
                 }
 
-            logger.info(f"🔍 Checking availability: {appointment_date} {start_time}-{end_time}")
-            logger.info(f"📋 Cached appointments: {len(self.appointments_cache)}")
+            # Reversed, midnight-crossing or zero-length ranges can't be booked on one date
+            # (only possible when the caller supplied the end time)
+            if proposed_end <= proposed_start:
+                return {
+                    "available": False,
+                    "message": "End time must be after start time."
+                }
+
+            logger.info("🔍 Checking availability: %s %s-%s (%d cached)",
+                        appointment_date, start_time, end_time, len(self.appointments_cache))
             
             # ✅ If cache is empty, try ONE quick API call as fallback
             if len(self.appointments_cache) == 0:
                 logger.warning("⚠️ Cache empty - attempting quick API call...")
                 try:
-                    from datetime import datetime as dt
-                    from_date = dt.now().strftime("%Y-%m-%d")
-                    url = f"{BACKEND_API_URL}/api/agent/get-appointments/{self.user_id}"
-                    params = {"from_date": from_date}
-                    
                     # ✅ Very short timeout - don't wait long
-                    async with httpx.AsyncClient(timeout=5.0) as client:
-                        response = await client.get(url, params=params)
-                        if response.status_code == 200:
-                            data = response.json()
-                            self.appointments_cache = data.get("appointments", [])
-                            logger.info(f"✅ Loaded {len(self.appointments_cache)} appointments via fallback")
+                    self._set_appointments(await get_appointments(self.user_id, timeout=5.0))
+                    logger.info("✅ Loaded %d appointments via fallback", len(self.appointments_cache))
                 except Exception as e:
-                    logger.error(f"❌ Fallback API call failed: {e}")
+                    logger.error("❌ Fallback API call failed: %s", e)
                     # Continue with empty cache
             
-            # Check for conflicts in cache
-            has_conflict = False
+            # Time ranges are pre-parsed per date, so only the overlap test runs here;
+            # a date with nothing booked has no entry and skips straight to "available"
             conflicting_appointment = None
-            
-            # ✅ FIX: Use time objects for comparison, not strings
-            for apt in self.appointments_cache:
-                if apt["date"] != appointment_date:
-                    continue
-                
-                try:
-                    # Robustly parse HH:MM or H:MM from cache
-                    apt_start_h, apt_start_m = map(int, str(apt["start_time"]).split(':'))
-                    apt_end_h, apt_end_m = map(int, str(apt["end_time"]).split(':'))
-                    
-                    apt_start_t = time(apt_start_h, apt_start_m)
-                    apt_end_t = time(apt_end_h, apt_end_m)
-
-                except Exception as e:
-                    logger.warning(f"⚠️ Could not parse cached time: {apt}. Skipping. Error: {e}")
-                    continue
-
+            for apt_start, apt_end, apt in self._appts_by_date.get(appointment_date, ()):
                 # ✅ Correct logical comparison for time ranges
                 # Conflict exists if:
                 # (Proposed start is before cached end) AND (Proposed end is after cached start)
-                if (proposed_start_t < apt_end_t and proposed_end_t > apt_start_t):
-                    has_conflict = True
+                if proposed_start < apt_end and proposed_end > apt_start:
                     conflicting_appointment = apt
-                    logger.info(f"⚠️ Conflict found: {apt}")
+                    logger.info("⚠️ Conflict found: %s", apt)
                     break
             
-            if has_conflict:
+            if conflicting_appointment is not None:
                 return {
                     "available": False,
                     "message": f"Your client already has '{conflicting_appointment['title']}' at {appointment_date} from {conflicting_appointment['start_time']} to {conflicting_appointment['end_time']}. Suggest a different time."
                 }
             else:
-                logger.info(f"✅ Time slot is available")
+                logger.info("✅ Time slot is available")
                 return {
                     "available": True,
                     "message": f"Your client is free on {appointment_date} at {start_time}. You can book this time."
                 }
                     
-        except Exception as e:
-            logger.error(f"❌ Error checking availability: {e}")
-            import traceback
-            traceback.print_exc()
-            # ✅ Assume available if error (better UX than blocking)
+        except Exception:
+            logger.exception("❌ Error checking availability")
             return {
-                "available": True,
-                "message": "I couldn't verify the schedule, but let's proceed with this time.",
-                "warning": "Schedule verification unavailable"
+                "available": False,
+                "message": "Internal error checking availability, please try a different time."
             }
         
 
@@ -719,32 +1053,35 @@ class SimpleOutboundCaller(Agent):
             appointment_date: Date in YYYY-MM-DD format (e.g., 2025-10-30)
         """
         # Speak status update before fetching
-        await _speak_status_update(ctx, "One moment, let me check our schedule...")
+        _speak_status_update(ctx, "One moment, let me check our schedule...")
         
         try:
-            logger.info(f" Getting booked times for: {appointment_date}")
+            logger.info(" Getting booked times for: %s", appointment_date)
             
-            booked_slots = [
-                apt for apt in self.appointments_cache
-                if apt["date"] == appointment_date
-            ]
+            booked_slots = self.appointments_by_date.get(appointment_date, [])
             
             if not booked_slots:
                 return {
                     "date": appointment_date,
-                    "message": f"Your client {self.caller_name} is completely free on {appointment_date}. Any time works!",
+                    "message": _FREE_DAY_MSG(self.caller_name, appointment_date),
                     "booked_slots": []
                 }
             
-            slots_info = ", ".join([f"{apt['start_time']}-{apt['end_time']}" for apt in booked_slots])
+            # Reuse the joined "start-end, ..." text while the day's bookings are unchanged
+            cached = self._slots_info_cache.get(appointment_date)
+            if cached and cached[0] == len(booked_slots):
+                slots_info = cached[1]
+            else:
+                slots_info = ", ".join([f"{apt['start_time']}-{apt['end_time']}" for apt in booked_slots])
+                self._slots_info_cache[appointment_date] = (len(booked_slots), slots_info)
             
             return {
                 "date": appointment_date,
-                "message": f"Your client is already booked at: {slots_info}. They're free at other times.",
+                "message": _BOOKED_AT_MSG(slots_info),
                 "booked_slots": booked_slots
             }
         except Exception as e:
-            logger.error(f"Error getting available times: {e}")
+            logger.error("Error getting available times: %s", e)
             return {"error": "Unable to fetch available times"}
 
     @function_tool()
@@ -770,43 +1107,41 @@ class SimpleOutboundCaller(Agent):
             notes: Any special instructions (e.g., "bring X-rays", "fast for 8 hours")
         """
         # Speak status update before booking
-        await _speak_status_update(ctx, "Perfect, let me get that booked for you...")
+        _speak_status_update(ctx, "Perfect, let me get that booked for you...")
         
         try:
             self.attendee_name = attendee_name
             
-            logger.info(f" Booking appointment: {appointment_date} {start_time}-{end_time}")
+            logger.info(" Booking appointment: %s %s-%s", appointment_date, start_time, end_time)
             
-            url = f"{BACKEND_API_URL}/api/agent/book-appointment"
-            logger.info(f" Booking URL: {url}")
-            payload = {
+            payload: BookPayload = {
                 "user_id": self.user_id,
                 "appointment_date": appointment_date,
                 "start_time": start_time,
                 "end_time": end_time,
                 "attendee_name": attendee_name,
                 "title": title,
-                "description": f"Appointment booked on behalf of {self.caller_name}",
+                "description": _BOOKING_DESCRIPTION(self.caller_name),
                 "organizer_name": self.caller_name,
                 "organizer_email": self.caller_email,
                 "notes": notes or ""
             }
             
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, json=payload)
-                logger.info(f" Response status: {response.status_code}")  #  Add this
-                logger.info(f" Response body: {response.text}")
-                data = response.json()
+            response = await post_json("/api/agent/book-appointment", payload, HTTP_TIMEOUTS["book"])
+            logger.info(" Response status: %d", response.status_code)
+            logger.debug(" Response body: %s", response.text)
+            data = orjson.loads(response.content)
             
             if data.get("success"):
-                self.appointments_cache.append({
+                invalidate_appointments(self.user_id)
+                self._set_appointments(self.appointments_cache + [{
                     "date": appointment_date,
                     "start_time": start_time,
                     "end_time": end_time,
                     "title": title
-                })
+                }])
                 
-                logger.info(f" Appointment booked successfully")
+                logger.info(" Appointment booked successfully")
                 
                 return {
                     "success": True,
@@ -819,10 +1154,8 @@ class SimpleOutboundCaller(Agent):
                     "message": data.get("message", "Failed to book appointment")
                 }
                 
-        except Exception as e:
-            logger.error(f" Error booking appointment: {e}")
-            logger.error(f"📋 Full traceback: {traceback.format_exc()}")
-            logger.error(f"Error booking appointment: {e}")
+        except Exception:
+            logger.exception(" Error booking appointment")
             return {"success": False, "error": "Unable to book appointment"}
 
     @function_tool()
@@ -848,14 +1181,29 @@ class SimpleOutboundCaller(Agent):
         except:
             pass
 
+def prewarm(proc: JobProcess):
+    """
+    Load models and verify storage once per worker process, before any job is assigned to it.
+    The S3 check runs alongside the VAD load; a bad bucket or credentials fails the process here
+    instead of on the first upload mid-call.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        s3_check = None
+        if SETTINGS.upload_transcripts or SETTINGS.upload_recordings:
+            s3_check = pool.submit(get_s3_client)
+        proc.userdata["vad"] = silero.VAD.load(min_silence_duration=0.05)
+        if s3_check is not None:
+            s3_check.result()
+
+
 async def entrypoint(ctx: JobContext):
     logger.info(f" Connecting to room {ctx.room.name}")
     
     # Parse metadata
     metadata_str = ctx.job.metadata or "{}"
     try:
-        dial_info = json.loads(metadata_str)
-    except json.JSONDecodeError:
+        dial_info = orjson.loads(metadata_str)
+    except orjson.JSONDecodeError:
         logger.error("Invalid metadata JSON")
         return
 
@@ -863,7 +1211,7 @@ async def entrypoint(ctx: JobContext):
     call_context = dial_info.get("call_context", "booking an appointment")
     user_id = dial_info.get("user_id")
     
-    voice_id = dial_info.get("voice_id", os.getenv("ELEVENLABS_VOICE_ID"))
+    voice_id = dial_info.get("voice_id", SETTINGS.elevenlabs_voice_id)
     voice_name = dial_info.get("voice_name", "default")
     language = dial_info.get("language", "en")
     
@@ -882,24 +1230,30 @@ async def entrypoint(ctx: JobContext):
         return
 
     agent = SimpleOutboundCaller(call_context=call_context, dial_info=dial_info)
+    # Everything needed has been extracted; don't keep the metadata (and its prompt copy) alive for the call
+    del dial_info
+
+    # One timestamp per job so the recording and transcript objects share a name stem
+    call_ts = _utc_compact_stamp()
+    safe_phone = phone_number.translate(_PHONE_STRIP)
     
     turn_detector = MultilingualModel()
     
     session = AgentSession(
         llm=openai.LLM(
             model="gpt-4.1-mini",
-            api_key=os.getenv("OPENAI_API_KEY")
+            api_key=SETTINGS.openai_api_key
         ),
         stt=deepgram.STT(
-            api_key=os.getenv("DEEPGRAM_API_KEY"),
+            api_key=SETTINGS.deepgram_api_key,
             model="nova-3",          
         ),
         tts=elevenlabs.TTS(
-            api_key=os.getenv("ELEVENLABS_API_KEY"),
+            api_key=SETTINGS.elevenlabs_api_key,
             model="eleven_flash_v2_5",
             voice_id=voice_id
         ),
-        vad=silero.VAD.load(min_silence_duration=0.05),
+        vad=ctx.proc.userdata["vad"],
         turn_detection=turn_detector,       
         min_endpointing_delay=0.05,
     )
@@ -907,33 +1261,25 @@ async def entrypoint(ctx: JobContext):
 
     async def upload_transcript():
         """Upload transcript to S3"""
-        if not UPLOAD_TRANSCRIPTS:
+        if not SETTINGS.upload_transcripts:
             logger.info("⏭️ Transcript upload disabled")
             return
 
         try:
             transcript_obj = session.history.to_dict() if hasattr(session, 'history') else {"messages": []}
-            transcript_json = json.dumps(transcript_obj, indent=2)
+            transcript_body = orjson.dumps(transcript_obj)
             
-            ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-            safe_phone = phone_number.replace("+", "").replace("-", "").replace(" ", "")
-            s3_key = f"transcripts/{ctx.room.name}_{safe_phone}_{ts}.json"
-
-            # Upload to S3
-            s3 = get_s3_client()
-            s3.put_object(
-                Bucket=AWS_BUCKET_NAME,
-                Key=s3_key,
-                Body=transcript_json.encode('utf-8'),
-                ContentType="application/json"
-            )
+            s3_key = f"transcripts/{ctx.room.name}_{safe_phone}_{call_ts}.json"
+
+            # Upload to S3 off the event loop (boto3 is blocking)
+            await upload_blob_async(s3_key, transcript_body, "application/json")
             
             logger.info(f"✅ Transcript uploaded: {s3_key}")
 
-            # Generate presigned URL (24h expiry)
-            signed_url = s3.generate_presigned_url(
+            # Generate presigned URL (24h expiry, signed locally)
+            signed_url = get_s3_client().generate_presigned_url(
                 'get_object',
-                Params={'Bucket': AWS_BUCKET_NAME, 'Key': s3_key},
+                Params={'Bucket': SETTINGS.aws_bucket_name, 'Key': s3_key},
                 ExpiresIn=86400
             )
 
@@ -944,98 +1290,63 @@ async def entrypoint(ctx: JobContext):
                 "transcript_blob": s3_key,
                 "recording_url": agent.recording_url,
                 "recording_blob": agent.recording_blob_path,
-                "uploaded_at": ts
+                "uploaded_at": _utc_compact_stamp()
             }
             
-            # Send to backend
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    async with httpx.AsyncClient(timeout=60.0) as c:
-                        response = await c.post(
-                            f"{BACKEND_API_URL}/api/agent/save-call-data", 
-                            json=payload
-                        )
-                        if response.status_code == 200:
-                            logger.info("✅ Data sent to backend")
-                            break
-                except httpx.ReadTimeout:
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(2)
-                except Exception as e:
-                    logger.error(f"Backend error: {e}")
-                    break
+            # Send to backend (retries timeouts, transport errors and 5xx with backoff + jitter)
+            try:
+                await _post_backend("/api/agent/save-call-data", payload, HTTP_TIMEOUTS["save"])
+                logger.info("✅ Data sent to backend")
+            except Exception as e:
+                logger.error(f"Backend error: {e}")
 
-        except Exception as e:
-            logger.error(f"❌ Upload failed: {e}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("❌ Upload failed")
     
-    ctx.add_shutdown_callback(upload_transcript)
+    async def finish_job():
+        # In order: the upload and the queue flush both use the shared HTTP client,
+        # which may only be released after they are done
+        try:
+            await upload_transcript()
+            await flush_backend_queue()
+        finally:
+            await release_http_client()
+
+    retain_http_client()
+    ctx.add_shutdown_callback(finish_job)
     
     await ctx.connect()
     await send_status_to_backend(ctx.room.name, "initialized", user_id)
 
     # Start recording with AWS S3
-    if UPLOAD_RECORDINGS:
+    if SETTINGS.upload_recordings:
         try:
-            safe_phone = phone_number.replace("+", "").replace("-", "").replace(" ", "")
-            ts = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
-            recording_key = f"recordings/{ctx.room.name}_{safe_phone}_{ts}.ogg"
+            recording_key = f"recordings/{ctx.room.name}_{safe_phone}_{call_ts}.ogg"
             
             agent.recording_blob_path = recording_key
             
             logger.info(f"🎙️ Starting recording: {recording_key}")
 
             # Build S3 upload config for LiveKit
-            req = api.RoomCompositeEgressRequest(
-                room_name=ctx.room.name,
-                audio_only=True,
-                file_outputs=[
-                    api.EncodedFileOutput(
-                        file_type=api.EncodedFileType.OGG,
-                        filepath=recording_key,
-                        s3=api.S3Upload(
-                            access_key=AWS_ACCESS_KEY_ID,
-                            secret=AWS_SECRET_ACCESS_KEY,
-                            region=AWS_REGION,
-                            bucket=AWS_BUCKET_NAME
-                        )
-                    )
-                ],
-            )
-            
-            lkapi = api.LiveKitAPI(
-                url=os.getenv("LIVEKIT_URL", "").replace("wss://", "https://"),
-                api_key=os.getenv("LIVEKIT_API_KEY"),
-                api_secret=os.getenv("LIVEKIT_API_SECRET"),
-            )
+            req = _egress_request(ctx.room.name, recording_key)
             
-            egress_resp = await lkapi.egress.start_room_composite_egress(req)
+            # ctx.api is the worker's long-lived LiveKit API client; no per-call client/aclose
+            egress_resp = await ctx.api.egress.start_room_composite_egress(req)
             agent.egress_id = egress_resp.egress_id
             
-            agent.recording_url = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{recording_key}"
+            agent.recording_url = _s3_object_url_prefix() + recording_key
             
             logger.info(f"✅ Recording started (ID: {agent.egress_id})")
             
-            # Notify backend
-            try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    await client.post(
-                        f"{BACKEND_API_URL}/api/update-call-recording",
-                        json={
-                            "call_id": ctx.room.name,
-                            "recording_blob": recording_key,
-                            "recording_url": agent.recording_url
-                        }
-                    )
-            except Exception as e:
-                logger.warning(f"Could not notify backend: {e}")
-            
-            await lkapi.aclose()
+            # Notify backend (queued; doesn't hold up dialing)
+            queue_backend_post("/api/update-call-recording", {
+                "call_id": ctx.room.name,
+                "recording_blob": recording_key,
+                "recording_url": agent.recording_url
+            })
             
-        except Exception as e:
-            logger.error(f"❌ Recording failed: {e}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("❌ Recording failed")
     else:
         logger.info("⏭️ Recording disabled")
 
@@ -1050,12 +1361,12 @@ async def entrypoint(ctx: JobContext):
 
     try:
         logger.info(f"📞 Dialing {phone_number}...")
-        asyncio.create_task(send_status_to_backend(ctx.room.name, "dialing", user_id))
+        await send_status_to_backend(ctx.room.name, "dialing", user_id)
         
         sip_response = await ctx.api.sip.create_sip_participant(
             api.CreateSIPParticipantRequest(
                 room_name=ctx.room.name,
-                sip_trunk_id=OUTBOUND_TRUNK_ID,
+                sip_trunk_id=SETTINGS.outbound_trunk_id,
                 sip_call_to=phone_number,
                 participant_identity=f"sip-{phone_number}",
                 wait_until_answered=True,
@@ -1068,18 +1379,9 @@ async def entrypoint(ctx: JobContext):
         participant = await ctx.wait_for_participant(identity=f"sip-{phone_number}")
         agent.set_participant(participant)
 
-        # Set started_at
-        try:
-            started_at = datetime.now(timezone.utc).isoformat()
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                await client.post(
-                    f"{BACKEND_API_URL}/api/update-call-started",
-                    json={"call_id": ctx.room.name, "started_at": started_at}
-                )
-        except Exception as e:
-            logger.warning(f"Could not set started_at: {e}")
-        
-        asyncio.create_task(send_status_to_backend(ctx.room.name, "connected", user_id))
+        # Set started_at (queued; the greeting doesn't wait on the backend)
+        queue_backend_post("/api/update-call-started", {"call_id": ctx.room.name, "started_at": _utc_now_iso()})
+        await send_status_to_backend(ctx.room.name, "connected", user_id)
 
         session_task = asyncio.create_task(
             session.start(agent=agent, room=ctx.room, room_input_options=RoomInputOptions())
@@ -1100,17 +1402,27 @@ async def entrypoint(ctx: JobContext):
         await send_status_to_backend(ctx.room.name, "unanswered", user_id)
         ctx.shutdown()
         
-    except Exception as e:
-        logger.error(f"❌ Error: {e}")
+    except Exception:
+        logger.exception("❌ Error")
         await send_status_to_backend(ctx.room.name, "failed", user_id)
-        traceback.print_exc()
         ctx.shutdown()
 
 
 if __name__ == "__main__":
+    # Fail at worker startup rather than mid-call; download-files runs at image build without secrets
+    if "download-files" not in sys.argv:
+        missing = SETTINGS.missing()
+        if missing:
+            raise SystemExit(f"Missing required environment variables: {', '.join(missing)}")
+        logger.info(
+            f"⚙️ Config: backend={SETTINGS.backend_api_url} "
+            f"upload_transcripts={SETTINGS.upload_transcripts} upload_recordings={SETTINGS.upload_recordings}"
+        )
+
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             agent_name="outbound-caller",
         )
     )
\ No newline at end of file
@@ -1,14 +1,47 @@
-from .router import router
+from .router import router, db, drain_call_updates
+from src.utils.utils import close_livekit_api, stop_transcript_workers
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 from urllib.request import Request
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import anyio.to_thread
+import asyncio
+import functools
+import logging
+import os
+import time
+
+
+@functools.lru_cache(maxsize=1)
+def _utc_iso_second(epoch_second: int) -> str:
+    # Keyed on the whole second so back-to-back health checks reuse one string.
+    return datetime.fromtimestamp(epoch_second, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Sync endpoints and streamed bodies run in anyio's threadpool (40 threads by default);
+    # leave room for DB-bound work so it queues on the DB pool instead of on threads
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE", "100"))
+    # Open the DB pool's connections before the first webhook/request needs one
+    try:
+        await asyncio.to_thread(db.warm_pool)
+    except Exception:
+        logging.exception("Postgres pool warm-up failed; connections will open lazily")
+    yield
+    await drain_call_updates()
+    await stop_transcript_workers()
+    await close_livekit_api()
+    db.close_pool()
+
 
 def create_app():
     from fastapi import FastAPI
     from fastapi.middleware.cors import CORSMiddleware
 
     app = FastAPI(
+        lifespan=lifespan,
         title="Auth",
         description="Assist the user using the Knowledgebase",
         version="0.1.0",
@@ -20,10 +53,15 @@ def create_app():
     app.max_request_size = 200 * 1024 * 1024
 
     # Set up CORS middleware
+    # ALLOWED_ORIGINS is a comma-separated list of frontend origins. An explicit list is
+    # matched by set membership and may carry credentials; the "*" fallback may not.
+    allowed_origins = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "").split(",") if o.strip()]
+    if not allowed_origins:
+        logging.warning("ALLOWED_ORIGINS not set, allowing any origin without credentials")
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],  # Specify the correct frontend origin here
-        allow_credentials=True,
+        allow_origins=allowed_origins or ["*"],
+        allow_credentials=bool(allowed_origins),
         allow_methods=["*"],  # Allows all methods
         allow_headers=["*"],  # Allows all headers
     )
@@ -33,7 +71,7 @@ def create_app():
     # Route Handlers
     @app.get("/health")
     async def health_check():
-        return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+        return {"status": "healthy", "timestamp": _utc_iso_second(int(time.time()))}
     
     @app.exception_handler(HTTPException)
     async def custom_http_exception_handler(request: Request, exc: HTTPException):
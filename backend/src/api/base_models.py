@@ -1,20 +1,64 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import List, Optional,Dict,Literal
+import re
+import sys
+from dataclasses import dataclass
+
+from pydantic import AfterValidator, BaseModel, BeforeValidator, ConfigDict, Field, StringConstraints, TypeAdapter, field_validator
+from typing import Annotated, Any, List, Optional,Dict,Literal
 from datetime import datetime
 
 
+# Every DTO here is built once and never mutated afterwards. Request bodies (untrusted
+# input) go through full validation; response models (UserOut, LoginResponse,
+# PromptResponse, ContactUpload*, ContactsListResponse, BulkCallResponse) are filled
+# from DB rows and values the server computed itself. defer_build postpones each
+# model's core-schema build to first use, so models no route touches never pay for one.
+FROZEN_DTO = ConfigDict(frozen=True, defer_build=True)
+
+# Deletes every ASCII character except digits and '+' in one C-level pass
+_PHONE_STRIP = str.maketrans("", "", "".join(
+    chr(i) for i in range(128) if not (chr(i).isdigit() or chr(i) == "+")
+))
+# E.164 shape: optional leading '+', then 10-15 ASCII digits
+_PHONE_OK = re.compile(r"\+?[0-9]{10,15}")
+
+
+def _lower(v):
+    return v.lower() if isinstance(v, str) else v
+
+
+# Voice names the router maps to ElevenLabs voice IDs; matched case-insensitively and
+# interned so downstream lookups/comparisons hit the canonical string object
+Voice = Annotated[Literal[
+    "sam elliott", "peck", "king", "barry white", "smokey burt",
+    "dark blues singer", "wyatt", "southern mike", "serafina", "paul",
+], BeforeValidator(_lower), AfterValidator(sys.intern)]
+Language = Annotated[Literal["en", "es"], BeforeValidator(_lower), AfterValidator(sys.intern)]
+
+# Shared constraint aliases so every field using them reuses one validator definition
+NonEmptyStr = Annotated[str, StringConstraints(min_length=1)]
+ShortName = Annotated[str, StringConstraints(min_length=1, max_length=255)]
+# Shape check only (checked in pydantic-core); avoids importing email-validator/dnspython
+Email = Annotated[str, StringConstraints(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)]
+
+
 ### =============== auth base model ====================
 
 class UserRegister(BaseModel):
+    model_config = FROZEN_DTO
+
     username: str
-    email: EmailStr
+    email: Email
     password: str
 
 class UserLogin(BaseModel):
+    model_config = FROZEN_DTO
+
     email: str  # We’ll use this to accept the username
     password: str
 
 class UserOut(BaseModel):
+    model_config = FROZEN_DTO
+
     id: int
     username: str
     email: str
@@ -23,12 +67,29 @@ class UserOut(BaseModel):
     created_at: datetime
     is_admin: bool = False #*
 
+    @classmethod
+    def from_row(cls, row: dict) -> "UserOut":
+        """Trusted DB row -> model without re-running validation (no type coercion)."""
+        return cls.model_construct(
+            id=row["id"],
+            username=row["username"],
+            email=row["email"],
+            first_name=row.get("first_name"),
+            last_name=row.get("last_name"),
+            created_at=row["created_at"],
+            is_admin=bool(row.get("is_admin")),
+        )
+
 class LoginResponse(BaseModel):
+    model_config = FROZEN_DTO
+
     access_token: str
     token_type: str
     user: UserOut
 
 class UpdateUserProfileRequest(BaseModel):
+    model_config = FROZEN_DTO
+
     # user_id: int
     first_name: Optional[str] = None
     last_name: Optional[str] = None
@@ -36,53 +97,45 @@ class UpdateUserProfileRequest(BaseModel):
     new_password: Optional[str] = None    
 
 
-class Assistant_Payload(BaseModel):
-    objective: str
-    context: str
-    # caller_number: str
-    caller_name: str
-    caller_number: str
-    caller_email: str
-    outbound_number : str
-    language : Literal['english', 'spanish']
-    voice : str
-    # outbound_number : str
-
-
 class CallDetailsPayload(BaseModel):
+    model_config = FROZEN_DTO
+
     # user_id: int
     call_id: str
     voice_name : str
     # caller_email: EmailStr
 
 class Assistant_Payload(BaseModel):
+    model_config = FROZEN_DTO
+
     outbound_number: str      # Phone number to dial
     caller_name: str          # Your name/company name
     caller_email: str         # Your email (for sending calendar invites)
     caller_number: str        # Your phone number
     # objective: str
     context: str
-    language: str 
-    voice: str 
+    language: Language
+    voice: Voice
 
 
 
 class PromptCustomizationUpdate(BaseModel):
-    system_prompt: str = Field(..., min_length=1, max_length=1000000)
+    model_config = FROZEN_DTO
 
+    system_prompt: str = Field(..., min_length=1, max_length=1000000)
 
-class ContactUploadResponse(BaseModel):
-    success: bool
-    message: str
-    stats: dict
 
 class ContactsListResponse(BaseModel):
+    model_config = FROZEN_DTO
+
     contacts: list
     pagination: Optional[dict] = None
 
 
 
-class ContactUploadStats(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ContactUploadStats:
+    """Plain counters; pydantic still validates/serializes it inside ContactUploadResponse."""
     total_rows: int
     inserted: int
     duplicates: int = 0
@@ -90,25 +143,34 @@ class ContactUploadStats(BaseModel):
     errors: int = 0
 
 class ContactUploadResponse(BaseModel):
+    model_config = FROZEN_DTO
+
     success: bool
     message: str
     stats: ContactUploadStats
 
 
 
-class BulkCallPayload(BaseModel):
+class _CallBase(BaseModel):
+    """Fields shared by the single and bulk call payloads."""
+    model_config = FROZEN_DTO
+
+    caller_name: NonEmptyStr = Field(description="Name of the caller")
+    caller_email: NonEmptyStr = Field(description="Email of the caller")
+    context: NonEmptyStr = Field(description="Call context/purpose")
+    system_prompt: NonEmptyStr = Field(description="The complete system prompt to use")
+    voice: Voice = Field(default="paul", description="Voice name (paul, sam elliott, serafina, etc.)")
+    language: Language = Field(default="en", description="Language code (en or es)")
+
+
+class BulkCallPayload(_CallBase):
     """
     Payload for bulk calling multiple phone numbers.
     """
-    phone_numbers: List[str] = Field(..., min_items=1, description="List of phone numbers to call")
-    caller_name: str = Field(..., min_length=1, description="Name of the caller")
-    caller_email: str = Field(..., min_length=1, description="Email of the caller")
-    context: str = Field(..., min_length=1, description="Call context/purpose")
-    system_prompt: str = Field(..., min_length=1, description="The complete system prompt to use")
-    voice: str = Field(default="david", description="Voice name (david, ravi, emily-british, etc.)")
-    language: str = Field(default="en", description="Language code (en or es)")
+    phone_numbers: List[str] = Field(..., min_length=1, description="List of phone numbers to call")
     
-    @validator('phone_numbers')
+    @field_validator('phone_numbers')
+    @classmethod
     def validate_phone_numbers(cls, v):
         if not v:
             raise ValueError("At least one phone number is required")
@@ -117,55 +179,87 @@ class BulkCallPayload(BaseModel):
         cleaned = []
         for num in v:
             # Remove spaces, dashes, etc.
-            clean = ''.join(c for c in num if c.isdigit() or c == '+')
-            if len(clean) < 10:
+            clean = num.translate(_PHONE_STRIP)
+            if not clean.isascii():
+                # Rare: non-ASCII separators or digits left over, filter them per char
+                clean = ''.join(c for c in clean if c.isdigit() or c == '+')
+            if not _PHONE_OK.fullmatch(clean):
                 raise ValueError(f"Invalid phone number: {num}")
             cleaned.append(clean)
         
         return cleaned
 
 
-class SingleCallPayload(BaseModel):
+class SingleCallPayload(_CallBase):
     """
     Payload for single call (backward compatibility).
     """
-    outbound_number: str = Field(..., min_length=1, description="Phone number to call")
-    caller_name: str = Field(..., min_length=1, description="Name of the caller")
-    caller_email: str = Field(..., min_length=1, description="Email of the caller")
-    context: str = Field(..., min_length=1, description="Call context/purpose")
-    system_prompt: str = Field(..., min_length=1, description="The complete system prompt to use")
-    voice: str = Field(default="david", description="Voice name")
-    language: str = Field(default="en", description="Language code")
+    outbound_number: NonEmptyStr = Field(description="Phone number to call")
 
 
 
 class CreatePromptRequest(BaseModel):
     """Request to create a new prompt"""
-    prompt_name: str = Field(..., min_length=1, max_length=255, description="Name/heading for the prompt")
-    system_prompt: str = Field(..., min_length=1, description="The actual prompt text")
+    model_config = FROZEN_DTO
+
+    prompt_name: ShortName = Field(description="Name/heading for the prompt")
+    system_prompt: NonEmptyStr = Field(description="The actual prompt text")
 
 
 class UpdatePromptRequest(BaseModel):
     """Request to update a prompt"""
-    prompt_name: Optional[str] = Field(None, min_length=1, max_length=255)
-    system_prompt: Optional[str] = Field(None, min_length=1)
+    model_config = FROZEN_DTO
+
+    prompt_name: Optional[ShortName] = None
+    system_prompt: Optional[NonEmptyStr] = None
 
 
 class PromptResponse(BaseModel):
     """Response containing prompt data"""
+    model_config = FROZEN_DTO
+
     id: int
     user_id: int
     prompt_name: str
     system_prompt: str
     is_default: bool
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_row(cls, row: dict) -> "PromptResponse":
+        """Trusted user_prompts row -> model without re-running validation."""
+        return cls.model_construct(
+            id=row["id"],
+            user_id=row["user_id"],
+            prompt_name=row["prompt_name"],
+            system_prompt=row["system_prompt"],
+            is_default=row["is_default"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+
+# Built once at import; constructing a TypeAdapter rebuilds its core schema every time
+PromptResponseList = TypeAdapter(List[PromptResponse])
 
 
 class BulkCallResponse(BaseModel):
     """Response for bulk calling"""
+    model_config = FROZEN_DTO
+
     success: bool
     message: str
     total_calls: int
-    initiated_calls: List[dict] 
-    failed_calls: List[dict] 
\ No newline at end of file
+    initiated_calls: List[Dict[str, Any]]
+    failed_calls: List[Dict[str, Any]]
+
+    @classmethod
+    def from_results(cls, total_calls: int, initiated_calls: List[Dict[str, Any]], failed_calls: List[Dict[str, Any]]) -> "BulkCallResponse":
+        return cls.model_construct(
+            success=True,
+            message=f"Initiated {len(initiated_calls)} of {total_calls} calls",
+            total_calls=total_calls,
+            initiated_calls=initiated_calls,
+            failed_calls=failed_calls,
+        ) 
\ No newline at end of file
@@ -1,13 +1,12 @@
-import json
 import logging
+import orjson
 import os
 import io
 
-import traceback
-from datetime import datetime, timedelta,timezone
-from typing import Dict, List, Optional, Tuple, Any
-import requests
+from datetime import datetime, timezone
+from typing import Dict, Optional
 import asyncio
+import time
 from dotenv import load_dotenv
 from fastapi import (
     APIRouter,
@@ -15,38 +14,31 @@ from fastapi import (
     HTTPException,
     Query,
     Request,
+    Response,
+    UploadFile,
+    File,
 )
-from datetime import datetime
-
-from fastapi.encoders import jsonable_encoder
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse,StreamingResponse
-from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import HTTPException, Response, UploadFile, File
-from rich import print
+
+from fastapi.exceptions import RequestValidationError
+from starlette.concurrency import iterate_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
 from src.api.base_models import (
     UserLogin,
     UserRegister,
     UserOut,
     LoginResponse,
-    UpdateUserProfileRequest,
-    Assistant_Payload,
-    PromptCustomizationUpdate,
-    ContactsListResponse,
-    ContactUploadResponse,
     ContactUploadResponse,
     ContactUploadStats,
     BulkCallResponse,
     PromptResponse,
-    UpdatePromptRequest,
-    CreatePromptRequest,
-    SingleCallPayload,
+    PromptResponseList,
     BulkCallPayload
 )
 from src.utils.db import PGDB 
 from src.utils.mail_management import Send_Mail
 from src.utils.jwt_utils import create_access_token
-from src.utils.utils import get_current_user,add_call_event, generate_presigned_url,fetch_and_store_transcript,fetch_and_store_recording, calculate_duration, check_if_answered
+from src.utils.utils import get_current_user,add_call_event, get_livekit_api, generate_presigned_url, schedule_transcript_fetch, check_if_answered
 from livekit import api
 from src.models.System_Prompt import PromptBuilder
 import csv
@@ -62,6 +54,9 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
+# Deletes every ASCII character except digits in one C-level pass (CSV phone cleanup)
+_NON_DIGITS = str.maketrans("", "", "".join(chr(i) for i in range(128) if not chr(i).isdigit()))
+
 # error response 
 def error_response(message, status_code=400):
     return JSONResponse(
@@ -72,7 +67,7 @@ def error_response(message, status_code=400):
 
 @router.post("/register")
 def register_user(user: UserRegister):
-    user_dict = user.dict()
+    user_dict = user.model_dump()
     #  Normalize both email and username
     user_dict["email"] = user_dict["email"].strip().lower()
     user_dict["username"] = user_dict["username"].strip().lower()
@@ -83,7 +78,7 @@ def register_user(user: UserRegister):
     except ValueError as ve:
         return error_response(status_code=400, message=str(ve))
     except Exception as e:
-        traceback.print_exc()
+        logging.exception(f"Registration failed: {e}")
         return error_response(status_code=500, message=f"Registration failed: {str(e)}")
 
 @router.post("/login",response_model=LoginResponse,)
@@ -101,11 +96,13 @@ def login_user(user: UserLogin):
         
         
         token = create_access_token({"sub": str(result["id"])})
-        return {
-            "access_token": token,
-            "token_type": "bearer",
-            "user": result
-        }
+        # Returning a JSONResponse skips FastAPI's dump-and-revalidate against
+        # response_model (still used for the OpenAPI schema)
+        return JSONResponse(LoginResponse.model_construct(
+            access_token=token,
+            token_type="bearer",
+            user=UserOut.from_row(result),
+        ).model_dump(mode="json"))
         
     except ValueError as ve:
         # Return 401 when credentials are invalid
@@ -117,7 +114,7 @@ def login_user(user: UserLogin):
     
 
 
-voices = {
+_VOICE_IDS = {
     "sam elliott":"1Le150XwaOV6DjrgvGiL",
     "peck":"KP0g0tgE6czKXsf2vmF6",
     "king":"1WVD88RnPY0xX4bYTFi4",
@@ -130,27 +127,40 @@ voices = {
     "paul":"6677dBjGbnngilI0IDYQ"
 }
 
-@router.post("/assistant-bulk-call")
+# Case-insensitive voice name -> ElevenLabs voice id, normalized once at import.
+# Voice/language are already validated against these names by BulkCallPayload.
+VOICES: Dict[str, str] = {name.lower(): voice_id for name, voice_id in _VOICE_IDS.items()}
+
+@router.post(
+    "/assistant-bulk-call",
+    response_class=ORJSONResponse,
+    # The body is validated by hand below; keep it documented in the OpenAPI schema
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": BulkCallPayload.model_json_schema()}},
+        }
+    },
+)
 async def make_bulk_calls_with_livekit(
-    payload: BulkCallPayload,
+    request: Request,
     user=Depends(get_current_user)
 ):
-    
+    # Validate straight from the raw bytes: pydantic-core parses the JSON itself instead
+    # of FastAPI decoding to a dict first and validating that dict afterwards
     try:
-        # Get voice_id from voice name
-        voice_name = payload.voice.lower()
-        voice_id = voices.get(voice_name)
-        
-        if not voice_id:
-            logging.warning(f"Unknown voice '{voice_name}', using default 'david'")
-            voice_id = voices["Paul"]
-            voice_name = "Paul"
-        
-        # Validate language
-        language = payload.language.lower()
-        if language not in ["en", "es"]:
-            logging.warning(f"Unknown language '{language}', defaulting to 'en'")
-            language = "en"
+        payload = BulkCallPayload.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Same 422 {"detail": [...]} body (locations under "body") as FastAPI-validated routes
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+    try:
+        # Get voice_id from voice name (payload.voice is a validated, lower-cased VOICES key)
+        voice_name = payload.voice
+        voice_id = VOICES[voice_name]
+        language = payload.language
         
         logging.info(f" Bulk call: voice={voice_name}, language={language}")
         logging.info(f" Calling {len(payload.phone_numbers)} numbers")
@@ -164,6 +174,19 @@ async def make_bulk_calls_with_livekit(
         initiated_calls = []
         failed_calls = []
         
+        # Everything except the phone number is the same for every call in the batch
+        static_metadata = {
+            # "call_context": payload.context,
+            "user_id": user["id"],
+            "caller_name": payload.caller_name,
+            "caller_email": user["email"],
+            "system_prompt": system_prompt,  # Use provided prompt
+            "agent_name": "PAUL",
+            "voice_id": voice_id,
+            "voice_name": voice_name,
+            "language": language
+        }
+        
         for phone_number in payload.phone_numbers:
             try:
                 # Generate unique room name for this call
@@ -171,23 +194,13 @@ async def make_bulk_calls_with_livekit(
                 room_name = f"call-{user['id']}-{phone_number.replace('+', '').replace('-', '')}-{timestamp}"
                 
                 # Prepare metadata for this specific call
-                metadata = {
-                    "phone_number": phone_number,
-                    # "call_context": payload.context,
-                    "user_id": user["id"],
-                    "caller_name": payload.caller_name,
-                    "caller_email": user["email"],
-                    "system_prompt": system_prompt,  # Use provided prompt
-                    "agent_name": "PAUL",
-                    "voice_id": voice_id,
-                    "voice_name": voice_name,
-                    "language": language
-                }
+                metadata = orjson.dumps({"phone_number": phone_number, **static_metadata}).decode()
                 
                 logging.info(f"📞 Initiating call to {phone_number} (room: {room_name})")
                 
                 # Create DB record
-                db.insert_call_history(
+                await asyncio.to_thread(
+                    db.insert_call_history,
                     user_id=user["id"],
                     call_id=room_name,
                     status="initiated",
@@ -195,24 +208,19 @@ async def make_bulk_calls_with_livekit(
                     voice_name=voice_name,
                 )
                 
-                add_call_event(room_name, "call_initiated", {
+                await asyncio.to_thread(add_call_event, room_name, "call_initiated", {
                     "user_id": user["id"],
                     "phone_number": phone_number
                 })
                 
-                # Dispatch agent to LiveKit
-                async with api.LiveKitAPI(
-                    url=os.getenv("LIVEKIT_URL", "").replace("wss://", "https://"),
-                    api_key=os.getenv("LIVEKIT_API_KEY"),
-                    api_secret=os.getenv("LIVEKIT_API_SECRET"),
-                ) as lkapi:
-                    dispatch = await lkapi.agent_dispatch.create_dispatch(
-                        api.CreateAgentDispatchRequest(
-                            agent_name="outbound-caller",
-                            room=room_name,
-                            metadata=json.dumps(metadata),
-                        )
+                # Dispatch agent to LiveKit (shared client, no per-call session/TLS setup)
+                dispatch = await get_livekit_api().agent_dispatch.create_dispatch(
+                    api.CreateAgentDispatchRequest(
+                        agent_name="outbound-caller",
+                        room=room_name,
+                        metadata=metadata,
                     )
+                )
                 
                 logging.info(f"✅ Call to {phone_number} dispatched: {dispatch.id}")
                 
@@ -228,8 +236,7 @@ async def make_bulk_calls_with_livekit(
                 await asyncio.sleep(0.5)
                 
             except Exception as e:
-                logging.error(f"❌ Failed to initiate call to {phone_number}: {e}")
-                traceback.print_exc()
+                logging.exception(f"❌ Failed to initiate call to {phone_number}: {e}")
                 
                 failed_calls.append({
                     "phone_number": phone_number,
@@ -239,7 +246,8 @@ async def make_bulk_calls_with_livekit(
                 # Mark as failed in DB if room was created
                 if 'room_name' in locals():
                     try:
-                        db.update_call_history(
+                        await asyncio.to_thread(
+                            db.update_call_history,
                             call_id=room_name,
                             updates={"status": "failed"}
                         )
@@ -247,21 +255,14 @@ async def make_bulk_calls_with_livekit(
                         pass
         
         # Build response
-        response = {
-            "success": True,
-            "message": f"Initiated {len(initiated_calls)} of {len(payload.phone_numbers)} calls",
-            "total_calls": len(payload.phone_numbers),
-            "initiated_calls": initiated_calls,
-            "failed_calls": failed_calls
-        }
+        response = BulkCallResponse.from_results(len(payload.phone_numbers), initiated_calls, failed_calls)
         
         logging.info(f"✅ Bulk call completed: {len(initiated_calls)} success, {len(failed_calls)} failed")
         
-        return JSONResponse(response)
+        return ORJSONResponse(response.model_dump())
         
     except Exception as e:
-        logging.error(f"❌ Bulk call error: {e}")
-        traceback.print_exc()
+        logging.exception(f"❌ Bulk call error: {e}")
         raise HTTPException(status_code=500, detail=f"Bulk call failed: {str(e)}")
 
 
@@ -463,69 +464,101 @@ async def make_bulk_calls_with_livekit(
 
                             
 
-@router.get("/call-history")
+_TRANSCRIPT_SPEAKER = {"assistant": "Assistant"}
+
+
+def _transcript_text(transcript: list) -> str:
+    """Flatten transcript message items to "Speaker: text" lines in one pass."""
+    return "\n".join(
+        f"{_TRANSCRIPT_SPEAKER.get(m.get('role'), 'User')}: "
+        + (" ".join(c) if type(c := m.get("content", "")) is list else str(c))
+        for m in transcript
+        if type(m) is dict and m.get("type") == "message"
+    )
+
+
+def _call_history_item(call: dict, omit_transcript: bool = False) -> dict:
+    """
+    One call_history row -> the /call-history item (datetimes left for orjson to encode).
+    omit_transcript drops the raw transcript and keeps only transcript_text.
+    """
+    call_data = {**call}
+    
+    #  FIX 2: Calculate display duration if not available
+    if not call_data.get("duration") and call.get("started_at") and call.get("ended_at"):
+        try:
+            start = call["started_at"] if isinstance(call["started_at"], datetime) else datetime.fromisoformat(str(call["started_at"]))
+            end = call["ended_at"] if isinstance(call["ended_at"], datetime) else datetime.fromisoformat(str(call["ended_at"]))
+            call_data["duration"] = round((end - start).total_seconds(), 1)
+        except:
+            call_data["duration"] = 0
+    
+    # Built in SQL for JSONB arrays; only legacy rows that stored the transcript
+    # as a JSON-encoded string still need formatting here
+    transcript_text = call.get("transcript_text")
+    if transcript_text is None and call.get("transcript"):
+        try:
+            tr = call["transcript"]
+            if isinstance(tr, str):
+                tr = call_data["transcript"] = orjson.loads(tr)
+            if type(tr) is list:
+                transcript_text = _transcript_text(tr)
+        except Exception as e:
+            logging.warning(f"Transcript parse error for {call.get('id')}: {e}")
+    
+    call_data["transcript_text"] = transcript_text
+    if omit_transcript:
+        del call_data["transcript"]
+    
+    call_data["has_recording"] = bool(call.get("recording_blob"))
+    if call.get("recording_blob"):
+        presigned_url = generate_presigned_url(call["recording_blob"], expiration=3600)
+        call_data["recording_presigned_url"] = presigned_url
+    else:
+        call_data["recording_presigned_url"] = None
+    
+    return call_data
+
+
+async def _call_history_ndjson(user_id: int, pagination: dict, rows, omit_transcript: bool):
+    """
+    NDJSON body for /call-history?stream=true: a header line with user_id and
+    pagination, then one line per call. The DB cursor is advanced in the threadpool so
+    it never blocks the event loop.
+    """
+    try:
+        yield orjson.dumps({"user_id": user_id, "pagination": pagination}) + b"\n"
+        async for call in iterate_in_threadpool(rows):
+            yield orjson.dumps(_call_history_item(call, omit_transcript)) + b"\n"
+    finally:
+        # Also reached on client disconnect; hands the DB connection back right away
+        rows.close()
+
+
+@router.get("/call-history", response_class=ORJSONResponse)
 async def get_user_call_history(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, le=100),
+    stream: bool = Query(False, description="Stream the page as NDJSON (header line, then one call per line)"),
+    omit_transcript: bool = Query(False, description="Leave out the raw transcript; transcript_text is still included"),
     user=Depends(get_current_user)
 ):
     try:
-        history = db.get_call_history_by_user_id(user["id"], page, page_size)
+        if stream:
+            # Opened (and the first row fetched) before responding, so DB errors still get a 500
+            pagination, rows = await asyncio.to_thread(
+                db.open_call_history_stream, user["id"], page, page_size, omit_transcript=omit_transcript
+            )
+            return StreamingResponse(
+                _call_history_ndjson(user["id"], pagination, rows, omit_transcript),
+                media_type="application/x-ndjson"
+            )
 
-        calls = []
-        for call in history.get("calls", []):
-            call_data = {**call}
-            
-            
-            if call.get("created_at"):
-                call_data["created_at"] = call["created_at"].isoformat() if hasattr(call["created_at"], 'isoformat') else str(call["created_at"])
-            
-            if call.get("started_at"):
-                call_data["started_at"] = call["started_at"].isoformat() if hasattr(call["started_at"], 'isoformat') else str(call["started_at"])
-            
-            if call.get("ended_at"):
-                call_data["ended_at"] = call["ended_at"].isoformat() if hasattr(call["ended_at"], 'isoformat') else str(call["ended_at"])
-            
-            #  FIX 2: Calculate display duration if not available
-            if not call_data.get("duration") and call.get("started_at") and call.get("ended_at"):
-                try:
-                    from datetime import datetime
-                    start = call["started_at"] if isinstance(call["started_at"], datetime) else datetime.fromisoformat(str(call["started_at"]))
-                    end = call["ended_at"] if isinstance(call["ended_at"], datetime) else datetime.fromisoformat(str(call["ended_at"]))
-                    call_data["duration"] = round((end - start).total_seconds(), 1)
-                except:
-                    call_data["duration"] = 0
-            
-            transcript_text = None
-            if call.get("transcript"):
-                try:
-                    tr = call["transcript"]
-                    if isinstance(tr, str):
-                        tr = json.loads(tr)
-                    if isinstance(tr, list):
-                        lines = []
-                        for msg in tr:
-                            if msg.get("type") == "message":
-                                speaker = "Assistant" if msg.get("role") == "assistant" else "User"
-                                text = " ".join(msg.get("content", [])) if isinstance(msg.get("content"), list) else str(msg.get("content"))
-                                lines.append(f"{speaker}: {text}")
-                        transcript_text = "\n".join(lines)
-                except Exception as e:
-                    logging.warning(f"Transcript parse error for {call.get('id')}: {e}")
-            
-            call_data["transcript_text"] = transcript_text
-            
-            call_data["has_recording"] = bool(call.get("recording_blob"))
-            if call.get("recording_blob"):
-                presigned_url = generate_presigned_url(call["recording_blob"], expiration=3600)
-                call_data["recording_presigned_url"] = presigned_url
-            else:
-                call_data["recording_presigned_url"] = None
-            
-            calls.append(call_data)
+        history = await asyncio.to_thread(
+            db.get_call_history_by_user_id, user["id"], page, page_size, omit_transcript
+        )
 
-            
-            calls.append(call_data)
+        calls = [_call_history_item(call, omit_transcript) for call in history.get("calls", [])]
 
         # Build pagination block safely
         pagination = history.get("pagination") or {
@@ -536,17 +569,14 @@ async def get_user_call_history(
             "not_completed_calls": history.get("not_completed_calls", 0),
         }
 
-        from fastapi.encoders import jsonable_encoder
-
-        return JSONResponse(content=jsonable_encoder({
+        return ORJSONResponse({
             "user_id": user["id"],
             "pagination": pagination,
             "calls": calls
-        }))
+        })
 
     except Exception as e:
-        logging.error(f"Error fetching history: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error fetching history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -554,7 +584,7 @@ async def get_user_call_history(
 async def get_appointments(user_id: int, from_date: str = None):
     """API for LiveKit agent to get all appointments for checking conflicts"""
     try:
-        appointments = db.get_user_appointments(user_id, from_date)
+        appointments = await asyncio.to_thread(db.get_user_appointments, user_id, from_date)
         
         return JSONResponse({
             "success": True,
@@ -620,7 +650,7 @@ async def book_appointment(request: Request):
     API for LiveKit agent to book an appointment
     """
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         
         user_id = data.get("user_id")
         appointment_date = data.get("appointment_date") 
@@ -635,7 +665,8 @@ async def book_appointment(request: Request):
         if not all([user_id, appointment_date, start_time, end_time, organizer_email]):
             return error_response("Missing required fields", status_code=400)
         
-        has_conflict = db.check_appointment_conflict(
+        has_conflict = await asyncio.to_thread(
+            db.check_appointment_conflict,
             user_id=user_id,
             appointment_date=appointment_date,
             start_time=start_time,
@@ -652,7 +683,8 @@ async def book_appointment(request: Request):
                 }
             )
         
-        appointment_id = db.create_appointment(
+        appointment_id = await asyncio.to_thread(
+            db.create_appointment,
             user_id=user_id,
             appointment_date=appointment_date,
             start_time=start_time,
@@ -691,7 +723,7 @@ async def book_appointment(request: Request):
 @router.post("/agent/save-call-data")
 async def save_call_data(request: Request):
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         
         call_id = data.get("call_id")
         transcript_blob = data.get("transcript_blob")  # S3 key
@@ -702,15 +734,11 @@ async def save_call_data(request: Request):
             "recording_blob": recording_blob
         }
         
-        db.update_call_history(call_id, updates)
+        await asyncio.to_thread(db.update_call_history, call_id, updates)
         
-        # Download from S3 (delayed)
+        # Download from S3 (delayed, handled by the transcript workers)
         if transcript_blob:
-            async def delayed_transcript():
-                await asyncio.sleep(5)
-                logging.info(f"📄 Downloading transcript from S3")
-                await fetch_and_store_transcript(call_id, None, transcript_blob)
-            asyncio.create_task(delayed_transcript())
+            schedule_transcript_fetch(call_id, transcript_blob)
         
         
         return JSONResponse({"success": True})
@@ -735,7 +763,11 @@ async def save_call_data(request: Request):
 
 
 
-@router.post("/prompts")
+# Same cap as PromptCustomizationUpdate.system_prompt; checked before any DB work
+MAX_PROMPT_CHARS = 1_000_000
+
+
+@router.post("/prompts", response_class=ORJSONResponse)
 async def create_prompt(
     request: Request,
     user=Depends(get_current_user)
@@ -750,7 +782,7 @@ async def create_prompt(
     }
     """
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         
         prompt_name = data.get("prompt_name", "").strip()
         system_prompt = data.get("system_prompt", "").strip()
@@ -764,19 +796,21 @@ async def create_prompt(
         if len(prompt_name) > 255:
             return error_response("prompt_name too long (max 255 chars)", status_code=400)
         
-        result = db.create_prompt(user["id"], prompt_name, system_prompt)
+        if len(system_prompt) > MAX_PROMPT_CHARS:
+            return error_response(f"system_prompt too long (max {MAX_PROMPT_CHARS} chars)", status_code=400)
+        
+        result = await asyncio.to_thread(db.create_prompt, user["id"], prompt_name, system_prompt)
         
-        return JSONResponse(content=jsonable_encoder({
+        return ORJSONResponse({
             "success": True,
             "message": "Prompt created successfully",
             "prompt": result
-        }), status_code=201)
+        }, status_code=201)
         
     except ValueError as ve:
         return error_response(str(ve), status_code=400)
     except Exception as e:
-        logging.error(f"Error creating prompt: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error creating prompt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -802,17 +836,16 @@ async def get_all_prompts(user=Depends(get_current_user)):
     }
     """
     try:
-        prompts = db.get_all_user_prompts(user["id"])
+        prompts = await asyncio.to_thread(db.get_all_user_prompts, user["id"])
         
-        return JSONResponse(content=jsonable_encoder({
+        return JSONResponse(content={
             "success": True,
             "count": len(prompts),
-            "prompts": prompts
-        }))
+            "prompts": PromptResponseList.dump_python([PromptResponse.from_row(p) for p in prompts], mode="json")
+        })
         
     except Exception as e:
-        logging.error(f"Error fetching prompts: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error fetching prompts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -825,23 +858,22 @@ async def get_prompt_by_id(
     Get a specific prompt by ID.
     """
     try:
-        prompt = db.get_prompt_by_id(user["id"], prompt_id)
+        prompt = await asyncio.to_thread(db.get_prompt_by_id, user["id"], prompt_id)
         
         if not prompt:
             return error_response("Prompt not found", status_code=404)
         
-        return JSONResponse(content=jsonable_encoder({
+        return JSONResponse(content={
             "success": True,
-            "prompt": prompt
-        }))
+            "prompt": PromptResponse.from_row(prompt).model_dump(mode="json")
+        })
         
     except Exception as e:
-        logging.error(f"Error fetching prompt: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error fetching prompt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("/prompts/{prompt_id}")
+@router.put("/prompts/{prompt_id}", response_class=ORJSONResponse)
 async def update_prompt(
     prompt_id: int,
     request: Request,
@@ -857,7 +889,7 @@ async def update_prompt(
     }
     """
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         
         prompt_name = data.get("prompt_name", "").strip() if "prompt_name" in data else None
         system_prompt = data.get("system_prompt", "").strip() if "system_prompt" in data else None
@@ -871,19 +903,24 @@ async def update_prompt(
         if prompt_name is None and system_prompt is None:
             return error_response("At least one field must be provided", status_code=400)
         
-        result = db.update_prompt(user["id"], prompt_id, prompt_name, system_prompt)
+        if prompt_name is not None and len(prompt_name) > 255:
+            return error_response("prompt_name too long (max 255 chars)", status_code=400)
+        
+        if system_prompt is not None and len(system_prompt) > MAX_PROMPT_CHARS:
+            return error_response(f"system_prompt too long (max {MAX_PROMPT_CHARS} chars)", status_code=400)
+        
+        result = await asyncio.to_thread(db.update_prompt, user["id"], prompt_id, prompt_name, system_prompt)
         
-        return JSONResponse(content=jsonable_encoder({
+        return ORJSONResponse({
             "success": True,
             "message": "Prompt updated successfully",
             "prompt": result
-        }))
+        })
         
     except ValueError as ve:
         return error_response(str(ve), status_code=400)
     except Exception as e:
-        logging.error(f"Error updating prompt: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error updating prompt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -896,7 +933,7 @@ async def delete_prompt(
     Delete a prompt (cannot delete default).
     """
     try:
-        db.delete_prompt(user["id"], prompt_id)
+        await asyncio.to_thread(db.delete_prompt, user["id"], prompt_id)
         
         return JSONResponse(content={
             "success": True,
@@ -906,12 +943,11 @@ async def delete_prompt(
     except ValueError as ve:
         return error_response(str(ve), status_code=400)
     except Exception as e:
-        logging.error(f"Error deleting prompt: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error deleting prompt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/prompts/{prompt_id}/set-default")
+@router.post("/prompts/{prompt_id}/set-default", response_class=ORJSONResponse)
 async def set_default_prompt(
     prompt_id: int,
     user=Depends(get_current_user)
@@ -920,19 +956,18 @@ async def set_default_prompt(
     Set a prompt as the default.
     """
     try:
-        result = db.set_default_prompt(user["id"], prompt_id)
+        result = await asyncio.to_thread(db.set_default_prompt, user["id"], prompt_id)
         
-        return JSONResponse(content=jsonable_encoder({
+        return ORJSONResponse({
             "success": True,
             "message": "Default prompt updated",
             "prompt": result
-        }))
+        })
         
     except ValueError as ve:
         return error_response(str(ve), status_code=400)
     except Exception as e:
-        logging.error(f"Error setting default: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error setting default: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
 
@@ -948,13 +983,7 @@ async def get_call_recording_url(
     try:
         
         # Get recording blob path from DB
-        with db.conn() as (conn, cursor):
-            cursor.execute("""
-                SELECT recording_blob
-                FROM call_history
-                WHERE call_id = %s AND user_id = %s
-            """, (call_id, user["id"]))
-            row = cursor.fetchone()
+        row = await asyncio.to_thread(db.get_call_recording_blob, call_id, user["id"])
         
         if not row:
             raise HTTPException(status_code=404, detail="Call not found")
@@ -980,29 +1009,30 @@ async def get_call_recording_url(
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error getting recording URL: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error getting recording URL: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
 
     
+# JSON texts of stored transcripts that count as "no transcript"
+_EMPTY_JSON = frozenset({"null", "[]", "{}", '""'})
+
+
 @router.get("/calls/{call_id}/transcript")
 async def get_call_transcript(call_id: str, user=Depends(get_current_user)):
     """Get transcript for a specific call"""
     try:
-        # ✅ Use the context manager pattern
-        with db.conn() as (conn, cursor):
-            cursor.execute("""
-                SELECT transcript
-                FROM call_history
-                WHERE call_id = %s AND user_id = %s
-            """, (call_id, user["id"]))
-            row = cursor.fetchone()
-        
-        if not row or not row["transcript"]:
+        row = await asyncio.to_thread(db.get_call_transcript, call_id, user["id"])
+        
+        if not row or not row["transcript"] or row["transcript"] in _EMPTY_JSON:
             raise HTTPException(status_code=404, detail="Transcript not found")
         
-        return JSONResponse({"transcript": row["transcript"]})
+        # Postgres already rendered the JSONB as JSON text; splice it in rather than
+        # decoding it into Python objects just to encode it again
+        return Response(
+            content=b'{"transcript":' + row["transcript"].encode() + b'}',
+            media_type="application/json"
+        )
         
     except HTTPException:
         raise
@@ -1046,7 +1076,9 @@ async def upload_contacts_csv(
             ).strip()
             
             # Quick clean
-            phone = ''.join(c for c in phone if c.isdigit())
+            phone = phone.translate(_NON_DIGITS)
+            if not phone.isascii():
+                phone = ''.join(c for c in phone if c.isdigit())
             
             # Skip if no phone or invalid length
             if not phone or len(phone) < 10:
@@ -1063,25 +1095,22 @@ async def upload_contacts_csv(
             raise HTTPException(status_code=400, detail="No valid contacts found")
         
         # Use FAST bulk insert
-        stats = db.save_contacts_bulk(user["id"], contacts)
+        stats = await asyncio.to_thread(db.save_contacts_bulk, user["id"], contacts)
         
         return {
             "success": True,
             "message": f"Successfully processed {stats['inserted']} contacts",
-            "stats": {
-                "total_rows": len(contacts),
-                "inserted": stats['inserted'],
-                "duplicates": stats['duplicates'],
-                "skipped": 0,
-                "errors": 0
-            }
+            "stats": ContactUploadStats(
+                total_rows=len(contacts),
+                inserted=stats['inserted'],
+                duplicates=stats['duplicates'],
+            )
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error uploading contacts: {e}")
-        traceback.print_exc()
+        logging.exception(f"Error uploading contacts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/contacts")
@@ -1091,7 +1120,7 @@ async def get_contacts_simple_list(user=Depends(get_current_user)):
     Perfect for dropdown lists or quick display
     """
     try:
-        contacts = db.get_contacts_simple(user["id"])
+        contacts = await asyncio.to_thread(db.get_contacts_simple, user["id"])
         
         return JSONResponse({
             "success": True,
@@ -1108,10 +1137,94 @@ async def get_contacts_simple_list(user=Depends(get_current_user)):
 
 
 
+# Webhook writes are coalesced per call_id and flushed together shortly after, so a
+# burst of events (room_finished + egress_ended across many rooms) costs one DB round
+# trip instead of one per event. Flushes are serialized to keep per-call ordering.
+WEBHOOK_FLUSH_DELAY = 0.05
+# Delay before re-flushing a batch whose DB write failed (the webhook already got its 200)
+WEBHOOK_FLUSH_RETRY_DELAY = 1.0
+_pending_call_updates: Dict[str, dict] = {}
+# Batch taken by the running flush, until its write has committed
+_inflight_call_updates: Dict[str, dict] = {}
+_call_updates_flush: Optional[asyncio.Task] = None
+_call_updates_lock = asyncio.Lock()
+
+
+def _queue_call_update(call_id: str, updates: dict):
+    _pending_call_updates.setdefault(call_id, {}).update(updates)
+    _schedule_call_updates_flush(WEBHOOK_FLUSH_DELAY)
+
+
+def _schedule_call_updates_flush(delay: float):
+    global _call_updates_flush
+    if _call_updates_flush is None:
+        _call_updates_flush = asyncio.create_task(_flush_call_updates(delay))
+
+
+def _unflushed_call_update(call_id: str) -> dict:
+    """Queued webhook writes for a call that may not be in the DB yet (newest wins)."""
+    return {**_inflight_call_updates.get(call_id, {}), **_pending_call_updates.get(call_id, {})}
+
+
+async def _flush_call_updates(delay: float):
+    global _call_updates_flush, _pending_call_updates, _inflight_call_updates
+    await asyncio.sleep(delay)
+    async with _call_updates_lock:
+        batch, _pending_call_updates = _pending_call_updates, {}
+        _inflight_call_updates = batch
+        # Anything queued from here on schedules a new flush (which waits for this one)
+        _call_updates_flush = None
+        try:
+            await asyncio.to_thread(db.update_call_history_batch, batch)
+        except Exception:
+            logging.exception(f"❌ Failed to flush webhook updates for {len(batch)} calls, retrying")
+            # Put the batch back under anything queued since; newer values win
+            for call_id, updates in batch.items():
+                _pending_call_updates[call_id] = {**updates, **_pending_call_updates.get(call_id, {})}
+            _schedule_call_updates_flush(WEBHOOK_FLUSH_RETRY_DELAY)
+        finally:
+            _inflight_call_updates = {}
+
+
+async def drain_call_updates(timeout: float = 10.0):
+    """
+    Wait for queued webhook writes to reach the DB (app shutdown), including a write
+    already in progress and any retry it schedules.
+    """
+    deadline = time.monotonic() + timeout
+    # A running flush clears _call_updates_flush before its write, so a held lock or
+    # leftover pending updates also mean there is still work to wait for
+    while _call_updates_flush is not None or _call_updates_lock.locked() or _pending_call_updates:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.error(f"❌ Gave up flushing webhook updates for {len(_pending_call_updates)} calls")
+            return
+        try:
+            if _call_updates_flush is not None:
+                await asyncio.wait_for(asyncio.shield(_call_updates_flush), remaining)
+            elif _call_updates_lock.locked():
+                await asyncio.wait_for(_call_updates_lock.acquire(), remaining)
+                _call_updates_lock.release()
+            else:
+                _schedule_call_updates_flush(0)
+        except asyncio.TimeoutError:
+            pass
+
+
+# Webhook events that are not persisted: check_if_answered only looks at
+# egress_started and participant_joined, and nothing else reads these back
+WEBHOOK_UNLOGGED_EVENTS = frozenset({
+    "room_started", "egress_updated", "track_published", "track_unpublished"
+})
+
+# Back-off (seconds) between end-of-call state reads; ~500 ms worst case in total
+WEBHOOK_END_STATE_RETRY = (0, 0.05, 0.1, 0.15, 0.2)
+
+
 @router.post("/livekit-webhook")
 async def livekit_webhook(request: Request):
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         event = data.get("event")
         room = data.get("room", {})
         call_id = room.get("name")
@@ -1123,45 +1236,48 @@ async def livekit_webhook(request: Request):
             if not call_id:
                 return JSONResponse({"message": "No call_id"})
 
-        # Always log event
-        add_call_event(call_id, event, data)
+        # High-volume events nothing reads back from events_log: acknowledge without a DB write
+        if event in WEBHOOK_UNLOGGED_EVENTS:
+            return JSONResponse({"message": f"{event} ignored"})
+
+        # Log the event
+        # (psycopg2 is blocking; DB work runs in a worker thread to keep the event loop free)
+        await asyncio.to_thread(add_call_event, call_id, event, data)
         
         # Ignore non-critical events
-        if event in ["room_started", "participant_joined", "egress_started", 
-                     "egress_updated", "track_published", "track_unpublished"]:
+        if event in ("participant_joined", "egress_started"):
             return JSONResponse({"message": f"{event} logged"})
 
         # Handle room end
         if event in ["room_finished", "participant_left"]:
-            await asyncio.sleep(0.5)
-            
-            # ✅ FIXED: Use context manager
-            with db.conn() as (conn, cursor):
-                cursor.execute("""
-                    SELECT status, events_log, started_at, created_at
-                    FROM call_history WHERE call_id = %s
-                """, (call_id,))
-                row = cursor.fetchone()
+            # Read straight away; only re-poll briefly if the row isn't there/consistent yet
+            for delay in WEBHOOK_END_STATE_RETRY:
+                if delay:
+                    await asyncio.sleep(delay)
+                row = await asyncio.to_thread(db.get_call_end_state, call_id)
+                if row and row["events_log"] is not None:
+                    break
 
             if not row:
                 return JSONResponse({"message": "Call not found"})
 
-            # ✅ Handle both dict and tuple results
-            if isinstance(row, dict):
-                current_status = row["status"]
-                events_log = row["events_log"]
-                db_started_at = row["started_at"]
-                created_at = row["created_at"]
-            else:
-                current_status, events_log, db_started_at, created_at = row
+            # Earlier webhook writes for this call may still be queued
+            unflushed = _unflushed_call_update(call_id)
+            if unflushed:
+                row = {**row, **unflushed}
+
+            current_status = row["status"]
+            events_log = row["events_log"]
+            db_started_at = row["started_at"]
+            created_at = row["created_at"]
             
             # Skip if already final
-            if current_status in {"completed", "unanswered"}:
+            if current_status in FINAL_STATUSES:
                 started = db_started_at or created_at
                 ended = datetime.now(timezone.utc)
                 duration = (ended - started).total_seconds() if started else 0
                 
-                db.update_call_history(call_id, {
+                _queue_call_update(call_id, {
                     "duration": max(0, duration),
                     "ended_at": ended
                 })
@@ -1180,7 +1296,7 @@ async def livekit_webhook(request: Request):
             ended = datetime.now(timezone.utc)
             duration = (ended - started).total_seconds() if (answered and started) else 0
 
-            db.update_call_history(call_id, {
+            _queue_call_update(call_id, {
                 "status": final_status,
                 "duration": max(0, duration),
                 "ended_at": ended,
@@ -1199,29 +1315,40 @@ async def livekit_webhook(request: Request):
                 location = file_info.get("location") or file_info.get("download_url")
                 
                 if location:
-                    db.update_call_history(call_id, {"recording_url": location})
+                    _queue_call_update(call_id, {"recording_url": location})
                     return JSONResponse({"message": "Recording saved"})
 
         return JSONResponse({"message": f"{event} processed"})
 
     except Exception as e:
-        logging.error(f"Webhook error: {e}")
-        traceback.print_exc()
+        logging.exception(f"Webhook error: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+# Call-status normalization tables, built once instead of per poll
+VALID_STATUSES = frozenset({"initialized", "dialing", "connected", "completed", "unanswered"})
+FINAL_STATUSES = frozenset({"completed", "unanswered"})
+# Legacy status values still found in older rows
+STATUS_MAP = {
+    "initiated": "initialized",
+    "in_progress": "connected",
+    "failed": "unanswered",
+    "not_attended": "unanswered"
+}
+STATUS_MESSAGES = {
+    "initialized": "Initializing...",
+    "dialing": "Dialing...",
+    "connected": "Call in progress",
+    "completed": "Call completed",
+    "unanswered": "Call not answered"
+}
+
+
 @router.get("/call-status/{call_id}")
 async def get_call_status(call_id: str):
     """Optimized status check with proper connection handling"""
     try:
-        # ✅ FIXED: Use context manager
-        with db.conn() as (conn, cursor):
-            cursor.execute("""
-                SELECT status, created_at, ended_at, duration, started_at
-                FROM call_history 
-                WHERE call_id = %s
-            """, (call_id,))
-            row = cursor.fetchone()
+        row = await asyncio.to_thread(db.get_call_status_row, call_id)
         
         if not row:
             return JSONResponse(
@@ -1229,24 +1356,14 @@ async def get_call_status(call_id: str):
                 content={"status": "not_found", "is_final": True}
             )
         
-        # ✅ Handle both dict and tuple
-        if isinstance(row, dict):
-            current_status = row["status"]
-            created_at = row["created_at"]
-            ended_at = row["ended_at"]
-            duration = row["duration"]
-            started_at = row["started_at"]
-        else:
-            current_status, created_at, ended_at, duration, started_at = row
+        current_status = row["status"]
+        created_at = row["created_at"]
+        ended_at = row["ended_at"]
+        duration = row["duration"]
+        started_at = row["started_at"]
         
         # Normalize status
-        if current_status not in {"initialized", "dialing", "connected", "completed", "unanswered"}:
-            STATUS_MAP = {
-                "initiated": "initialized",
-                "in_progress": "connected",
-                "failed": "unanswered",
-                "not_attended": "unanswered"
-            }
+        if current_status not in VALID_STATUSES:
             current_status = STATUS_MAP.get(current_status, "initialized")
         
         # Calculate elapsed time
@@ -1256,17 +1373,11 @@ async def get_call_status(call_id: str):
                 created_at = created_at.replace(tzinfo=timezone.utc)
             time_elapsed = (datetime.now(timezone.utc) - created_at).total_seconds()
         
-        is_final = current_status in {"completed", "unanswered"}
+        is_final = current_status in FINAL_STATUSES
         
         response = {
             "status": current_status,
-            "message": {
-                "initialized": "Initializing...",
-                "dialing": "Dialing...",
-                "connected": "Call in progress",
-                "completed": "Call completed",
-                "unanswered": "Call not answered"
-            }.get(current_status, current_status),
+            "message": STATUS_MESSAGES[current_status],
             "time_elapsed": round(time_elapsed, 1),
             "is_final": is_final
         }
@@ -1282,56 +1393,97 @@ async def get_call_status(call_id: str):
         return JSONResponse(response)
         
     except Exception as e:
-        logging.error(f"get_call_status error: {e}")
-        traceback.print_exc()
+        logging.exception(f"get_call_status error: {e}")
         return JSONResponse(
             {"status": "error", "message": str(e), "is_final": True},
             status_code=500
         )
 
 
+def _agent_event_error(data) -> Optional[tuple[dict, int]]:
+    """(response body, status code) for an invalid agent status event, or None if it is valid."""
+    if not isinstance(data, dict):
+        return {"error": "Invalid event"}, 400
+    
+    if not data.get("call_id") or not data.get("status"):
+        return {"error": "Missing data"}, 400
+    
+    if data["status"] not in {"initialized", "dialing", "connected", "unanswered"}:
+        return {"error": "Invalid status"}, 400
+    
+    return None
+
+
+def _apply_agent_event(data: dict) -> tuple[dict, int]:
+    """
+    Validate and persist one agent status event; returns (response body, status code).
+    Blocking (psycopg2) - call it through asyncio.to_thread from request handlers.
+    """
+    error = _agent_event_error(data)
+    if error:
+        return error
+    
+    # started_at (dialing/connected) and unanswered end fields are decided in the UPDATE itself
+    db.apply_agent_status(data["call_id"], data["status"], datetime.now(timezone.utc))
+    
+    return {"success": True}, 200
+
+
+def _apply_agent_events(events: list) -> list:
+    """
+    Validate and persist a batch of agent status events in order, in one DB transaction;
+    returns one result per event. Blocking - call it through asyncio.to_thread.
+    """
+    outcomes = [_agent_event_error(event) for event in events]
+    valid = [i for i, error in enumerate(outcomes) if error is None]
+    
+    if valid:
+        applied = db.apply_agent_statuses(
+            [(events[i]["call_id"], events[i]["status"]) for i in valid],
+            datetime.now(timezone.utc)
+        )
+        for i, result in zip(valid, applied):
+            if isinstance(result, Exception):
+                logging.error(f"report-event-batch error for {events[i]['call_id']}: {result}")
+                outcomes[i] = {"error": str(result)}, 500
+            else:
+                outcomes[i] = {"success": True}, 200
+    
+    return [
+        {"call_id": event.get("call_id") if isinstance(event, dict) else None, "status_code": status_code, **body}
+        for event, (body, status_code) in zip(events, outcomes)
+    ]
+
+
 @router.post("/agent/report-event")
 async def receive_agent_event(request: Request):
     try:
-        data = await request.json()
-        
-        call_id = data.get("call_id")
-        status = data.get("status")
-        timestamp = data.get("timestamp")
-        
-        if not call_id or not status:
-            return JSONResponse({"error": "Missing data"}, status_code=400)
+        data = orjson.loads(await request.body())
+        body, status_code = await asyncio.to_thread(_apply_agent_event, data)
+        return JSONResponse(body, status_code=status_code)
         
-        if status not in {"initialized", "dialing", "connected", "unanswered"}:
-            return JSONResponse({"error": "Invalid status"}, status_code=400)
-        
-        updates = {"status": status}
-        now = datetime.now(timezone.utc)
-        
-        # Set started_at on dialing or connected
-        if status in {"dialing", "connected"}:
-            # ✅ FIXED: Use context manager
-            with db.conn() as (conn, cursor):
-                cursor.execute(
-                    "SELECT started_at FROM call_history WHERE call_id = %s",
-                    (call_id,)
-                )
-                row = cursor.fetchone()
-                if row:
-                    started = row.get("started_at") if isinstance(row, dict) else row[0]
-                    if not started:
-                        updates["started_at"] = now
+    except Exception as e:
+        logging.exception(f"report-event error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/agent/report-event-batch")
+async def receive_agent_event_batch(request: Request):
+    """
+    Apply a batch of agent status events in order.
+    Each event gets its own result so one bad event doesn't reject the rest.
+    """
+    try:
+        data = orjson.loads(await request.body())
+        events = data.get("events")
         
-        # Handle unanswered
-        if status == "unanswered":
-            updates["ended_at"] = now
-            updates["duration"] = 0
+        if not isinstance(events, list):
+            return JSONResponse({"error": "Missing events"}, status_code=400)
         
-        db.update_call_history(call_id, updates)
+        results = await asyncio.to_thread(_apply_agent_events, events)
         
-        return JSONResponse({"success": True})
+        return JSONResponse({"success": True, "results": results})
         
     except Exception as e:
-        logging.error(f"report-event error: {e}")
-        traceback.print_exc()
-        return JSONResponse({"error": str(e)}, status_code=500)
\ No newline at end of file
+        logging.exception(f"report-event-batch error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
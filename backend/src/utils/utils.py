@@ -5,13 +5,20 @@ from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
 from src.utils.jwt_utils import decode_access_token
+import asyncio
+import functools
 import logging
 import os
 import json
-import traceback
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
 from botocore.config import Config
 
 from datetime import datetime, timezone, timedelta
+from typing import Optional
 from livekit import api
 
 # AWS imports (replacing GCS)
@@ -23,9 +30,18 @@ from src.utils.db import PGDB
 db = PGDB()
 auth_scheme = HTTPBearer()
 
+# Verified JWT claims keyed by a digest of the raw token, so repeat requests with the
+# same token skip signature verification. Entries live at most _JWT_CACHE_TTL seconds
+# and never past the token's own exp.
+_JWT_CACHE_TTL = 5.0
+_JWT_CACHE_MAX = 10_000
+_jwt_cache: "OrderedDict[bytes, tuple[float, dict]]" = OrderedDict()
+_jwt_cache_lock = threading.Lock()  # get_current_user runs in FastAPI's threadpool
 
+
+@functools.lru_cache(maxsize=1)
 def get_s3_client():
-    """Initialize AWS S3 client"""
+    """AWS S3 client, built once per process (boto3 clients are thread-safe)"""
     aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
     aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
     aws_region = os.getenv("AWS_REGION", "us-east-2")
@@ -37,27 +53,54 @@ def get_s3_client():
         's3',
         aws_access_key_id=aws_access_key,
         aws_secret_access_key=aws_secret_key,
-        region_name=aws_region
+        region_name=aws_region,
+        config=Config(signature_version='s3v4')
     )
 
 
+def _decode_token_cached(token: str):
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    now = time.monotonic()
+    with _jwt_cache_lock:
+        entry = _jwt_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    payload = decode_access_token(token)
+    if payload and "sub" in payload:
+        ttl = _JWT_CACHE_TTL
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            with _jwt_cache_lock:
+                _jwt_cache[key] = (now + ttl, payload)
+                _jwt_cache.move_to_end(key)
+                if len(_jwt_cache) > _JWT_CACHE_MAX:
+                    _jwt_cache.popitem(last=False)
+    return payload
+
+
+# 401 challenge header, shared by every rejected request
+_BEARER_CHALLENGE = MappingProxyType({"WWW-Authenticate": "Bearer"})
+
+
 def get_current_user(token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
     try:
-        logging.info(f"token: {token}")
-        payload = decode_access_token(token.credentials)
+        payload = _decode_token_cached(token.credentials)
         if not payload or "sub" not in payload:
             logging.warning("JWT decode failed or missing 'sub' claim.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token",
-                headers={"WWW-Authenticate": "Bearer"},
+                headers=_BEARER_CHALLENGE,
             )
     except Exception as e:
         logging.error(f"JWT decode error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
+            headers=_BEARER_CHALLENGE,
         )
 
     user_id = int(payload["sub"])
@@ -101,59 +144,42 @@ def is_admin(current_user=Depends(get_current_user)):
 
 def add_call_event(call_id: str, event_type: str, event_data: dict = None):
     """Store event in call_history.events_log (deduplicated)"""
-    try:
-        with db.conn() as (conn, cursor):
-            cursor.execute("SELECT events_log FROM call_history WHERE call_id = %s", (call_id,))
-            row = cursor.fetchone()
-            
-            if not row:
-                logging.warning(f"Call {call_id} not found for event {event_type}")
-                return
+    db.add_call_event(call_id, event_type, event_data)
 
-            events_log = row.get("events_log") if isinstance(row, dict) else row[0]
-            events_log = events_log or []
-            
-            if isinstance(events_log, str):
-                try:
-                    events_log = json.loads(events_log)
-                except Exception:
-                    events_log = []
-
-            if any(ev.get("event") == event_type for ev in events_log):
-                logging.info(f"Duplicate event {event_type} ignored for {call_id}")
-                return
-
-            events_log.append({
-                "event": event_type,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "data": event_data or {}
-            })
-
-            cursor.execute(
-                "UPDATE call_history SET events_log = %s WHERE call_id = %s",
-                (json.dumps(events_log), call_id)
-            )
-            conn.commit()
-            
-    except Exception as e:
-        logging.error(f"Error adding call event: {e}")
-        traceback.print_exc()
 
+_livekit_api: Optional[api.LiveKitAPI] = None
 
-async def get_livekit_call_status(call_id: str):
-    """Get current status from LiveKit API"""
-    try:
-        lkapi = api.LiveKitAPI(
+
+def get_livekit_api() -> api.LiveKitAPI:
+    """
+    Process-wide LiveKit server API client, reused across requests so each call
+    doesn't open its own aiohttp session + TLS connection. Created lazily because
+    the client must be built inside the running event loop.
+    """
+    global _livekit_api
+    if _livekit_api is None:
+        _livekit_api = api.LiveKitAPI(
             url=os.getenv("LIVEKIT_URL", "").replace("wss://", "https://"),
             api_key=os.getenv("LIVEKIT_API_KEY"),
             api_secret=os.getenv("LIVEKIT_API_SECRET"),
         )
-        
-        room_info = await lkapi.room.list_rooms(api.ListRoomsRequest())
+    return _livekit_api
+
+
+async def close_livekit_api():
+    """Close the shared LiveKit client (app shutdown)."""
+    global _livekit_api
+    if _livekit_api is not None:
+        await _livekit_api.aclose()
+        _livekit_api = None
+
+
+async def get_livekit_call_status(call_id: str):
+    """Get current status from LiveKit API"""
+    try:
+        room_info = await get_livekit_api().room.list_rooms(api.ListRoomsRequest())
         room_exists = any(room.name == call_id for room in room_info.rooms)
         
-        await lkapi.aclose()
-        
         if room_exists:
             return {"status": "active", "message": "Call is in progress"}
         else:
@@ -164,6 +190,56 @@ async def get_livekit_call_status(call_id: str):
         return {"status": "unknown", "error": str(e)}
 
 
+def _read_s3_object(key: str) -> bytes:
+    response = get_s3_client().get_object(Bucket=os.getenv("AWS_S3_BUCKET_NAME"), Key=key)
+    return response['Body'].read()
+
+
+# Post-call transcript downloads. The agent uploads the transcript right before it calls
+# save-call-data, so each fetch waits TRANSCRIPT_FETCH_DELAY first. A fixed set of
+# workers drains one queue instead of spawning a sleeping task per call.
+TRANSCRIPT_FETCH_DELAY = 5.0
+TRANSCRIPT_WORKERS = 4
+_transcript_queue: Optional[asyncio.Queue] = None
+_transcript_workers: list = []
+
+
+def schedule_transcript_fetch(call_id: str, transcript_blob: str):
+    """Queue a transcript download; workers start lazily inside the running loop."""
+    global _transcript_queue
+    if _transcript_queue is None:
+        _transcript_queue = asyncio.Queue()
+        _transcript_workers.extend(
+            asyncio.create_task(_transcript_worker(_transcript_queue)) for _ in range(TRANSCRIPT_WORKERS)
+        )
+    _transcript_queue.put_nowait((time.monotonic() + TRANSCRIPT_FETCH_DELAY, call_id, transcript_blob))
+
+
+async def _transcript_worker(queue: asyncio.Queue):
+    while True:
+        ready_at, call_id, transcript_blob = await queue.get()
+        try:
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            logging.info(f"📄 Downloading transcript from S3")
+            await fetch_and_store_transcript(call_id, None, transcript_blob)
+        except Exception:
+            logging.exception(f"❌ Transcript fetch failed for {call_id}")
+        finally:
+            queue.task_done()
+
+
+async def stop_transcript_workers():
+    """Cancel the transcript workers (app shutdown)."""
+    global _transcript_queue
+    for task in _transcript_workers:
+        task.cancel()
+    await asyncio.gather(*_transcript_workers, return_exceptions=True)
+    _transcript_workers.clear()
+    _transcript_queue = None
+
+
 async def fetch_and_store_transcript(call_id: str, transcript_url: str = None, transcript_blob: str = None):
     """Download transcript from S3 and store in DB"""
     try:
@@ -172,11 +248,7 @@ async def fetch_and_store_transcript(call_id: str, transcript_url: str = None, t
         if transcript_blob:
             logging.info(f"📥 Downloading transcript from S3: {transcript_blob}")
             try:
-                s3 = get_s3_client()
-                bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
-                
-                response = s3.get_object(Bucket=bucket_name, Key=transcript_blob)
-                transcript_json = response['Body'].read().decode('utf-8')
+                transcript_json = await asyncio.to_thread(_read_s3_object, transcript_blob)
                 transcript_data = json.loads(transcript_json)
                 
                 logging.info(f"✅ Downloaded transcript from S3")
@@ -188,8 +260,7 @@ async def fetch_and_store_transcript(call_id: str, transcript_url: str = None, t
                     logging.error(f"❌ S3 error: {e}")
                 return None
             except Exception as e:
-                logging.error(f"❌ Download failed: {e}")
-                traceback.print_exc()
+                logging.exception(f"❌ Download failed: {e}")
                 return None
         else:
             logging.warning(f"⚠️ No transcript_blob for {call_id}")
@@ -215,8 +286,7 @@ async def fetch_and_store_transcript(call_id: str, transcript_url: str = None, t
         return None
         
     except Exception as e:
-        logging.error(f"❌ Error fetching transcript: {e}")
-        traceback.print_exc()
+        logging.exception(f"❌ Error fetching transcript: {e}")
         return None
 
 
@@ -255,8 +325,7 @@ async def fetch_and_store_recording(call_id: str, recording_url: str = None, rec
             logging.warning(f"⚠️ Recording not found in bucket: {recording_blob_name}")
             
     except Exception as e:
-        logging.error(f"❌ Error verifying recording: {e}")
-        traceback.print_exc()
+        logging.exception(f"❌ Error verifying recording: {e}")
 
 
 
@@ -267,22 +336,8 @@ def generate_presigned_url(s3_key: str, expiration: int = 3600) -> str:
     try:
         bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
         
-        # 🔍 Debug: Check what credentials are being loaded
-        import boto3
-        session = boto3.Session(
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION", "us-east-2")
-        )
-        
-        credentials = session.get_credentials()
-        logging.info(f"🔑 Access Key: {credentials.access_key}")
-        logging.info(f"🔑 Secret Key (first 5): {credentials.secret_key[:5]}...")
-        logging.info(f"🔑 Token: {credentials.token}")  # Should be None for IAM users
-        
-        s3_client = session.client('s3', config=Config(signature_version='s3v4'))
-        
-        url = s3_client.generate_presigned_url(
+        # Presigning is local signing with the shared client; no session/client per URL
+        url = get_s3_client().generate_presigned_url(
             'get_object',
             Params={
                 'Bucket': bucket_name,
@@ -295,8 +350,7 @@ def generate_presigned_url(s3_key: str, expiration: int = 3600) -> str:
         return url
         
     except Exception as e:
-        logging.error(f"❌ Failed to generate presigned URL for {s3_key}: {e}")
-        traceback.print_exc()
+        logging.exception(f"❌ Failed to generate presigned URL for {s3_key}: {e}")
         return None
 
 def calculate_duration(started_at, ended_at) -> float: